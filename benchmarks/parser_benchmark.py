@@ -0,0 +1,413 @@
+#!/usr/bin/python
+'''
+Microbenchmarks of readers.parser, on synthetic VCF files:
+
+    header         Reader construction on a header of many ## lines
+    info           INFO-heavy records (ANN, Number=A, flags) read with next
+    info_lite      the same records as lite_records, reading two INFO keys
+    info_batches   the same records read with iter_batches
+    samples        multi-sample records, every sample column parsed
+    samples_lazy   the same records with parse_samples=False
+    gzip           the INFO-heavy records from a plain gzip file
+    bgzip          the INFO-heavy records from a bgzip file
+    write          Writer.write_record of the INFO-heavy records
+    write_bulk     Writer.write_records of the same records
+    write_raw      Writer.write_records of PASS records of the INFO-heavy
+                   file, read as lite records keeping their raw lines
+
+For every case the best of the repeated runs is reported in records (header
+lines for the header case) and MB of uncompressed VCF per second. Every run
+is appended as one JSON line to the history file and compared with the last
+run of the history on the same sizes.
+
+    python -m benchmarks.parser_benchmark [-o <input folder>] [-r <history.jsonl>]
+        [-n <records>] [-s <samples>] [-R <repeat>] [-t <tolerance>] [-c <case,...>]
+
+The input files are generated in the folder unless it already holds them
+(a temporary folder by default). The exit code is 1 when any case got slower
+than the tolerance (default 1.2x) against the previous run.
+'''
+
+import getopt
+import gzip
+import io
+import json
+import os
+import os.path as path
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+REPOSITORY_FOLDER = path.dirname(path.dirname(path.realpath(__file__)))
+if REPOSITORY_FOLDER not in sys.path:
+    sys.path.insert(0, REPOSITORY_FOLDER)
+
+from readers.bgzf import BgzfWriter
+from readers.parser import Reader, Writer
+
+HISTORY_FILE = "parser_benchmark_history.jsonl"
+
+HEADER_FILE = "header.vcf"
+INFO_FILE = "info.vcf"
+SAMPLES_FILE = "samples.vcf"
+
+HEADER_CONTIGS = 3000
+
+INFO_HEADER = '''##INFO=<ID=ANN,Number=.,Type=String,Description="Functional annotations">
+##INFO=<ID=DP,Number=1,Type=Integer,Description="Total Depth">
+##INFO=<ID=MQ,Number=1,Type=Float,Description="RMS Mapping Quality">
+##INFO=<ID=AF,Number=A,Type=Float,Description="Allele Frequency">
+##INFO=<ID=AC,Number=A,Type=Integer,Description="Allele count">
+##INFO=<ID=TLOD,Number=1,Type=Float,Description="Tumor LOD score">
+##INFO=<ID=NLOD,Number=1,Type=Float,Description="Normal LOD score">
+##INFO=<ID=ECNT,Number=1,Type=Integer,Description="Number of events in this haplotype">
+##INFO=<ID=DB,Number=0,Type=Flag,Description="dbSNP Membership">
+##INFO=<ID=SOMATIC,Number=0,Type=Flag,Description="Somatic mutation">
+##INFO=<ID=GENES,Number=.,Type=String,Description="Overlapping genes">
+##FILTER=<ID=q10,Description="Quality below 10">
+##FILTER=<ID=clustered_events,Description="Clustered events observed in the tumor">
+'''
+
+SAMPLES_HEADER = '''##INFO=<ID=DP,Number=1,Type=Integer,Description="Total Depth">
+##INFO=<ID=AF,Number=A,Type=Float,Description="Allele Frequency">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="Genotype Quality">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read Depth">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">
+'''
+
+COLUMNS = "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO"
+CHROMOSOMES = [str(c) for c in range(1, 23)] + ["X", "Y"]
+FILTERS = ["PASS", "PASS", "PASS", "q10", "clustered_events", "q10;clustered_events", "."]
+EFFECTS = ["missense_variant", "synonymous_variant", "stop_gained", "intron_variant", "upstream_gene_variant"]
+IMPACTS = ["HIGH", "MODERATE", "LOW", "MODIFIER"]
+
+CASES = ["header", "info", "info_lite", "info_batches", "samples", "samples_lazy", "gzip", "bgzip", "write",
+         "write_bulk", "write_raw"]
+
+
+class ParserInputs(object):
+    '''
+    Writes the synthetic VCF files of the benchmark to folder: a header only
+    file, an INFO-heavy sites file of records records (plain, gzip and bgzip)
+    and a file of records records with samples sample columns.
+    '''
+
+    def __init__(self, folder, records, samples, seed=0):
+        self.__folder = folder
+        self.__records = records
+        self.__samples = samples
+        self.__seed = seed
+
+    def filename(self, name):
+        return path.join(self.__folder, name)
+
+    def generate(self):
+        os.makedirs(self.__folder, exist_ok=True)
+        rng = random.Random(self.__seed)
+        self.__write(HEADER_FILE, self.__headerLines())
+        info = self.__write(INFO_FILE, self.__infoLines(rng))
+        with gzip.open(self.filename(INFO_FILE + ".gz"), 'wb') as f:
+            f.write(info)
+        writer = BgzfWriter(open(self.filename(INFO_FILE + ".bgz"), 'wb'))
+        writer.write(info)
+        writer.close()
+        self.__write(SAMPLES_FILE, self.__sampleLines(rng))
+
+    def exists(self):
+        return all(path.exists(self.filename(name)) for name in
+                   (HEADER_FILE, INFO_FILE, INFO_FILE + ".gz", INFO_FILE + ".bgz", SAMPLES_FILE))
+
+    def __write(self, name, lines):
+        data = "".join(lines).encode("ascii")
+        with open(self.filename(name), 'wb') as f:
+            f.write(data)
+        return data
+
+    def __headerLines(self):
+        lines = ["##fileformat=VCFv4.1\n", INFO_HEADER]
+        lines.extend("##contig=<ID=ctg%06d,length=%d>\n" % (i, 100000 + i) for i in range(HEADER_CONTIGS))
+        lines.append(COLUMNS + "\n")
+        return lines
+
+    def __positions(self, rng):
+        perChromosome = max(1, self.__records // len(CHROMOSOMES))
+        pos = 0
+        for i in range(self.__records):
+            chrom = CHROMOSOMES[min(i // perChromosome, len(CHROMOSOMES) - 1)]
+            pos = rng.randint(1, 1000) if i % perChromosome == 0 else pos + rng.randint(1, 20000)
+            yield chrom, pos
+
+    def __infoLines(self, rng):
+        lines = ["##fileformat=VCFv4.1\n", INFO_HEADER, COLUMNS + "\n"]
+        for chrom, pos in self.__positions(rng):
+            ref = rng.choice("ACGT")
+            alts = rng.sample([b for b in "ACGT" if b != ref], rng.choice((1, 1, 1, 2)))
+            annotations = []
+            for _ in range(rng.randint(1, 4)):
+                gene = "GENE%d" % rng.randint(0, 5000)
+                annotations.append("|".join([rng.choice(alts), rng.choice(EFFECTS), rng.choice(IMPACTS), gene, gene,
+                                             "transcript", "ENST%011d" % rng.randint(0, 10 ** 6), "protein_coding",
+                                             "1/5", "c.%d%s>%s" % (rng.randint(1, 5000), ref, alts[0]),
+                                             "", "", "", "", "", ""]))
+            info = ["ANN=" + ",".join(annotations), "DP=%d" % rng.randint(5, 500), "MQ=%.2f" % rng.uniform(20, 60),
+                    "AF=" + ",".join("%.3f" % rng.random() for _ in alts),
+                    "AC=" + ",".join(str(rng.randint(0, 4)) for _ in alts),
+                    "TLOD=%.2f" % rng.uniform(0, 60), "NLOD=%.2f" % rng.uniform(0, 30),
+                    "ECNT=%d" % rng.randint(1, 3), "GENES=" + ",".join(a.split("|")[3] for a in annotations)]
+            if rng.random() < 0.3:
+                info.append("DB")
+            if rng.random() < 0.2:
+                info.append("SOMATIC")
+            lines.append("\t".join([chrom, str(pos), "rs%d" % rng.randint(1, 10 ** 8) if rng.random() < 0.3 else ".",
+                                    ref, ",".join(alts), "%.1f" % rng.uniform(0, 100), rng.choice(FILTERS),
+                                    ";".join(info)]) + "\n")
+        return lines
+
+    def __sampleLines(self, rng):
+        names = ["S%04d" % i for i in range(self.__samples)]
+        lines = ["##fileformat=VCFv4.1\n", SAMPLES_HEADER,
+                 COLUMNS + "\tFORMAT\t" + "\t".join(names) + "\n"]
+        for chrom, pos in self.__positions(rng):
+            ref, alt = rng.sample("ACGT", 2)
+            samples = []
+            for _ in names:
+                if rng.random() < 0.05:
+                    samples.append("./.:.:.:.")
+                    continue
+                depth = rng.randint(0, 60)
+                altDepth = rng.randint(0, depth)
+                samples.append("%s:%d:%d:%d,%d" % (rng.choice(("0/0", "0/1", "1/1", "0|1")), rng.randint(0, 99),
+                                                    depth, depth - altDepth, altDepth))
+            lines.append("\t".join([chrom, str(pos), ".", ref, alt, "%.1f" % rng.uniform(0, 100), "PASS",
+                                    "DP=%d;AF=%.3f" % (rng.randint(5, 500), rng.random()), "GT:GQ:DP:AD"]
+                                   + samples) + "\n")
+        return lines
+
+
+def readRecords(filename, **options):
+    records = 0
+    for record in Reader(filename=filename, **options):
+        records += 1
+    return records
+
+
+def readLite(filename):
+    records = 0
+    for record in Reader(filename=filename, lite_records=True):
+        record.INFO.get("DP")
+        record.INFO.get("TLOD")
+        records += 1
+    return records
+
+
+def readBatches(filename):
+    records = 0
+    for batch in Reader(filename=filename).iter_batches():
+        records += len(batch.POS)
+    return records
+
+
+def readHeaders(filename, times):
+    for _ in range(times):
+        Reader(filename=filename)
+    with open(filename) as f:
+        return sum(1 for line in f) * times
+
+
+def writeRecords(template, records):
+    stream = io.StringIO()
+    writer = Writer(stream, template)
+    start = stream.tell()
+    for record in records:
+        writer.write_record(record)
+    return len(records), stream.tell() - start
+
+
+def writeBulk(template, records):
+    stream = io.StringIO()
+    writer = Writer(stream, template)
+    start = stream.tell()
+    return writer.write_records(records), stream.tell() - start
+
+
+def writePassRecords(filename):
+    reader = Reader(filename=filename, filter_pass_only=True, lite_records=True, raw_lines=True)
+    stream = io.StringIO()
+    writer = Writer(stream, reader, passthrough=True)
+    start = stream.tell()
+    return writer.write_records(reader), stream.tell() - start
+
+
+class ParserBenchmark(object):
+    '''
+    Runs the cases on the files of a ParserInputs and records, for every
+    case, the best time of repeat runs and its throughputs.
+    '''
+
+    def __init__(self, inputs, repeat):
+        self.__inputs = inputs
+        self.__repeat = repeat
+        self.__results = []
+
+    def getResults(self):
+        return self.__results
+
+    def run(self, cases):
+        infoFile = self.__inputs.filename(INFO_FILE)
+        samplesFile = self.__inputs.filename(SAMPLES_FILE)
+        headerFile = self.__inputs.filename(HEADER_FILE)
+        infoSize = path.getsize(infoFile)
+        samplesSize = path.getsize(samplesFile)
+        headerTimes = 20
+        functions = {
+            "header": (lambda: readHeaders(headerFile, headerTimes), path.getsize(headerFile) * headerTimes),
+            "info": (lambda: readRecords(infoFile), infoSize),
+            "info_lite": (lambda: readLite(infoFile), infoSize),
+            "info_batches": (lambda: readBatches(infoFile), infoSize),
+            "samples": (lambda: readRecords(samplesFile), samplesSize),
+            "samples_lazy": (lambda: readRecords(samplesFile, parse_samples=False), samplesSize),
+            "gzip": (lambda: readRecords(infoFile + ".gz"), infoSize),
+            "bgzip": (lambda: readRecords(infoFile + ".bgz", compressed=True), infoSize),
+        }
+        for case in cases:
+            if case in ("write", "write_bulk"):
+                template = Reader(filename=infoFile)
+                records = list(template)
+                write = writeRecords if case == "write" else writeBulk
+                self.__time(case, lambda: write(template, records))
+            elif case == "write_raw":
+                self.__time(case, lambda: writePassRecords(infoFile))
+            else:
+                function, size = functions[case]
+                self.__time(case, lambda: (function(), size))
+
+    def __time(self, case, function):
+        best = None
+        for _ in range(self.__repeat):
+            start = time.perf_counter()
+            items, size = function()
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        self.__results.append({"case": case, "items": items, "bytes": size, "seconds": best,
+                               "itemsPerSecond": items / best if best > 0 else None,
+                               "MBPerSecond": size / 1e6 / best if best > 0 else None})
+
+    def report(self):
+        print("=" * 80)
+        print("%-14s %10s %12s %12s %16s %10s" % ("case", "seconds", "items", "MB", "items/s", "MB/s"))
+        for r in self.__results:
+            print("%-14s %10.3f %12d %12.2f %16.0f %10.2f" % (r["case"], r["seconds"], r["items"], r["bytes"] / 1e6,
+                                                            r["itemsPerSecond"] or 0, r["MBPerSecond"] or 0))
+        print("=" * 80)
+
+
+def gitRevision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPOSITORY_FOLDER,
+                                       stderr=subprocess.DEVNULL).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previousRun(historyFile, sizes):
+    '''
+    The last run of the history on the same sizes, None if there is none.
+    '''
+    if not path.exists(historyFile):
+        return None
+    previous = None
+    with open(historyFile) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                run = json.loads(line)
+                if run.get("sizes") == sizes:
+                    previous = run
+    return previous
+
+
+def compareWithRun(results, previous, tolerance):
+    previousTimes = {r["case"]: r["seconds"] for r in previous["results"]}
+    regressions = []
+    print("Comparison with the run of " + previous["time"] + " (" + str(previous.get("revision")) +
+          ", tolerance " + str(tolerance) + "x):")
+    for r in results:
+        if r["case"] not in previousTimes or previousTimes[r["case"]] <= 0:
+            continue
+        ratio = r["seconds"] / previousTimes[r["case"]]
+        flag = ""
+        if ratio > tolerance:
+            flag = "  <-- regression"
+            regressions.append(r["case"])
+        print("%-14s %10.3f -> %10.3f  %.2fx%s" % (r["case"], previousTimes[r["case"]], r["seconds"], ratio, flag))
+    return regressions
+
+
+def usage():
+    print('parser_benchmark.py [-o <input folder>] [-r <history.jsonl>] [-n <records>] [-s <samples>] '
+          '[-R <repeat>] [-t <tolerance>] [-c <case,...>]')
+
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "ho:r:n:s:R:t:c:")
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    inputFolder = None
+    historyFile = path.abspath(HISTORY_FILE)
+    sizes = {"records": 20000, "samples": 50}
+    repeat = 3
+    tolerance = 1.2
+    cases = CASES
+    for opt, arg in opts:
+        if opt == '-h':
+            usage()
+            sys.exit()
+        elif opt == "-o":
+            inputFolder = path.abspath(arg)
+        elif opt == "-r":
+            historyFile = path.abspath(arg)
+        elif opt == "-n":
+            sizes["records"] = int(arg)
+        elif opt == "-s":
+            sizes["samples"] = int(arg)
+        elif opt == "-R":
+            repeat = int(arg)
+        elif opt == "-t":
+            tolerance = float(arg)
+        elif opt == "-c":
+            cases = arg.split(",")
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        print("Unknown cases: " + ", ".join(unknown) + " (cases: " + ", ".join(CASES) + ")")
+        sys.exit(2)
+
+    with tempfile.TemporaryDirectory() as temporaryFolder:
+        inputs = ParserInputs(inputFolder or temporaryFolder, sizes["records"], sizes["samples"])
+        if inputFolder is not None and inputs.exists():
+            print("Using the VCF files in " + inputFolder)
+        else:
+            print("Generating the VCF files...")
+            inputs.generate()
+        benchmark = ParserBenchmark(inputs, repeat)
+        benchmark.run(cases)
+    benchmark.report()
+
+    run = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": gitRevision(), "sizes": sizes,
+           "repeat": repeat, "python": platform.python_version(), "machine": platform.machine(),
+           "cpus": os.cpu_count(), "results": benchmark.getResults()}
+    previous = previousRun(historyFile, sizes)
+    with open(historyFile, 'a') as f:
+        f.write(json.dumps(run) + "\n")
+    print("Results appended to " + historyFile)
+    if previous is not None and compareWithRun(benchmark.getResults(), previous, tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,350 @@
+#!/usr/bin/python
+'''
+Checks the faster reading modes of readers.parser against the reference
+path (Reader(filename=...) iterated with next, every column parsed) on a
+corpus of VCF files:
+
+    gzip, bgzip       the reference path on compressed copies of the file
+    lazy_samples      parse_samples=False, then decode_samples
+    lite              lite_records=True, then decode_samples
+    info_fields       info_fields restricted to every other INFO key
+    iter_fields       the raw CHROM, POS, FILTER and INFO columns
+    iter_batches      the Batch columns, per record
+    filter_pass       filter_pass_only=True
+    require_filters   require_filters, for every FILTER value of the file
+    fetch             fetch through the sidecar index, plain and bgzip,
+                      with INFO END giving the end of the records having it
+    writer            Writer.write_record and write_records output read
+                      back, of full and lite records, and the raw lines
+                      written back by passthrough
+    columns           iter_batches from the columnar copy, plain and bgzip,
+                      against iter_batches from the text
+
+    python -m benchmarks.parser_conformance [-c <corpus folder>] [-n <synthetic records>] [<vcf>...]
+
+The corpus is benchmarks/conformance unless another folder is given, along
+with the VCF files given and the synthetic INFO and sample files of
+benchmarks.parser_benchmark (-n 0 leaves these out). Every mismatch is
+reported with the first record it differs on, and the exit code is then 1.
+'''
+
+import getopt
+import glob
+import gzip
+import io
+import math
+import os.path as path
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+REPOSITORY_FOLDER = path.dirname(path.dirname(path.realpath(__file__)))
+if REPOSITORY_FOLDER not in sys.path:
+    sys.path.insert(0, REPOSITORY_FOLDER)
+
+from benchmarks.parser_benchmark import INFO_FILE, SAMPLES_FILE, ParserInputs
+from readers import vcfcolumns, vcfindex
+from readers.bgzf import BgzfWriter
+from readers.parser import Reader, Writer
+
+CORPUS_FOLDER = path.join(path.dirname(path.realpath(__file__)), "conformance")
+
+
+def comparable(value):
+    '''
+    value with its NaN floats, which never compare equal, replaced by 'nan'.
+    '''
+    if isinstance(value, float) and math.isnan(value):
+        return 'nan'
+    if isinstance(value, (list, tuple)):
+        return [comparable(x) for x in value]
+    return value
+
+
+def canonical(record):
+    '''
+    The comparable content of a record: every column, the INFO values and
+    the sample calls.
+    '''
+    return (record.CHROM, record.POS, record.ID, record.REF, [str(alt) for alt in record.ALT], record.QUAL,
+            record.FILTER, sorted((key, comparable(value)) for key, value in record.INFO.items()), record.FORMAT,
+            [(call.sample, comparable(list(call.data))) for call in record.samples])
+
+
+def decoded(reader):
+    for record in reader:
+        reader.decode_samples(record)
+        yield canonical(record)
+
+
+def rawColumns(filename):
+    '''
+    The tab separated columns of the data lines of a plain VCF file.
+    '''
+    with open(filename) as f:
+        return [line.rstrip("\n").split("\t") for line in f if line.strip() and not line.startswith("#")]
+
+
+def recordEnd(record):
+    '''
+    The zero-based exclusive end of a reference record, from its INFO END
+    when it has one.
+    '''
+    end = record.INFO.get("END")
+    if isinstance(end, int):
+        return max(record.start + 1, end)
+    return record.start + max(1, len(record.REF))
+
+
+def isMissing(value):
+    if isinstance(value, (bool, np.bool_)):
+        return not value
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class ConformanceCheck(object):
+    '''
+    Compares every mode with the reference records of one VCF file, copied
+    (inflated, for .gz files) with its compressed versions and their indexes
+    to a scratch folder.
+    '''
+
+    def __init__(self, filename, folder):
+        self.__name = path.basename(filename)
+        self.__plain = path.join(folder, self.__name[:-len(".gz")] if filename.endswith(".gz") else self.__name)
+        with (gzip.open if filename.endswith(".gz") else open)(filename, 'rb') as f:
+            data = f.read()
+        with open(self.__plain, 'wb') as f:
+            f.write(data)
+        self.__gzip = self.__plain + ".gz"
+        with gzip.open(self.__gzip, 'wb') as f:
+            f.write(data)
+        self.__bgzip = self.__plain + ".bgz"
+        writer = BgzfWriter(open(self.__bgzip, 'wb'))
+        writer.write(data)
+        writer.close()
+        self.__reference = list(Reader(filename=self.__plain))
+        self.__expected = [canonical(record) for record in self.__reference]
+        self.__failures = []
+
+    def getFailures(self):
+        return self.__failures
+
+    def run(self):
+        modes = [("gzip", self.__checkGzip), ("bgzip", self.__checkBgzip), ("lazy_samples", self.__checkLazySamples),
+                 ("lite", self.__checkLite), ("info_fields", self.__checkInfoFields),
+                 ("iter_fields", self.__checkIterFields), ("iter_batches", self.__checkIterBatches),
+                 ("filter_pass", self.__checkFilterPass), ("require_filters", self.__checkRequireFilters),
+                 ("fetch", self.__checkFetch), ("writer", self.__checkWriter), ("columns", self.__checkColumns)]
+        for mode, check in modes:
+            try:
+                failure = check()
+            except Exception as e:
+                failure = "raised " + type(e).__name__ + ": " + str(e)
+            print("%-28s %-16s %s" % (self.__name, mode, "ok" if failure is None else "MISMATCH " + failure))
+            if failure is not None:
+                self.__failures.append((self.__name, mode, failure))
+
+    def __compare(self, records, expected):
+        records = list(records)
+        for i, (record, wanted) in enumerate(zip(records, expected)):
+            if record != wanted:
+                return "at record %d: %r != %r" % (i, record, wanted)
+        if len(records) != len(expected):
+            return "%d records instead of %d" % (len(records), len(expected))
+        return None
+
+    def __checkGzip(self):
+        return self.__compare(map(canonical, Reader(filename=self.__gzip)), self.__expected)
+
+    def __checkBgzip(self):
+        return self.__compare(map(canonical, Reader(filename=self.__bgzip, compressed=True)), self.__expected)
+
+    def __checkLazySamples(self):
+        return self.__compare(decoded(Reader(filename=self.__plain, parse_samples=False)), self.__expected)
+
+    def __checkLite(self):
+        return self.__compare(decoded(Reader(filename=self.__plain, lite_records=True)), self.__expected)
+
+    def __checkInfoFields(self):
+        fields = set(sorted(Reader(filename=self.__plain).infos)[::2])
+        expected = [wanted[:7] + ([item for item in wanted[7] if item[0] in fields],) + wanted[8:]
+                    for wanted in self.__expected]
+        return self.__compare(map(canonical, Reader(filename=self.__plain, info_fields=fields)), expected)
+
+    def __checkIterFields(self):
+        expected = [(row[0], row[1], row[6], row[7]) for row in rawColumns(self.__plain)]
+        return self.__compare(Reader(filename=self.__plain).iter_fields(), expected)
+
+    def __checkIterBatches(self):
+        reader = Reader(filename=self.__plain)
+        rows = []
+        for batch in reader.iter_batches(n=3):
+            for i in range(len(batch.POS)):
+                # numeric columns hold NaN for absent and missing values alike
+                info = {key: column[i] for key, column in batch.INFO.items() if not isMissing(column[i])}
+                rows.append((reader.chrom_codes[batch.CHROM[i]], int(batch.POS[i]), batch.ID[i], batch.REF[i],
+                             batch.ALT[i], batch.QUAL[i], reader.filter_codes[batch.FILTER[i]], info))
+        for i, (row, record, columns) in enumerate(zip(rows, self.__reference, rawColumns(self.__plain))):
+            qual = np.float32(np.nan if record.QUAL is None else record.QUAL)
+            expected = (record.CHROM, record.POS, record.ID, record.REF, columns[4], qual, columns[6],
+                        {key: value for key, value in record.INFO.items() if not isMissing(value)})
+            if row[:5] != expected[:5] or row[6] != expected[6] or \
+                    not (row[5] == expected[5] or (np.isnan(row[5]) and np.isnan(expected[5]))):
+                return "at record %d: %r != %r" % (i, row[:7], expected[:7])
+            if sorted(row[7]) != sorted(expected[7]) or \
+                    any(row[7][key] != value for key, value in expected[7].items()):
+                return "at record %d: INFO %r != %r" % (i, row[7], expected[7])
+        if len(rows) != len(self.__reference):
+            return "%d records instead of %d" % (len(rows), len(self.__reference))
+        return None
+
+    def __filterValues(self):
+        return sorted({row[6] for row in rawColumns(self.__plain)})
+
+    def __checkFilterPass(self):
+        expected = [wanted for wanted, columns in zip(self.__expected, rawColumns(self.__plain))
+                    if columns[6] == "PASS"]
+        return self.__compare(map(canonical, Reader(filename=self.__plain, filter_pass_only=True)), expected)
+
+    def __checkRequireFilters(self):
+        for value in self.__filterValues():
+            required = value.split(";")
+            expected = [wanted for wanted, columns in zip(self.__expected, rawColumns(self.__plain))
+                        if set(required).issubset(columns[6].split(";"))]
+            for filename, compressed in ((self.__plain, False), (self.__bgzip, True)):
+                failure = self.__compare(map(canonical, Reader(filename=filename, compressed=compressed,
+                                                               require_filters=required)), expected)
+                if failure is not None:
+                    return "requiring " + value + " from " + path.basename(filename) + " " + failure
+        return None
+
+    def __checkFetch(self):
+        regions = []
+        for chrom in sorted({record.CHROM for record in self.__reference}):
+            starts = sorted(record.start for record in self.__reference if record.CHROM == chrom)
+            regions.append((chrom, None, None))
+            regions.append((chrom, starts[len(starts) // 2], None))
+            regions.append((chrom, starts[0], starts[-1]))
+            regions.append((chrom, starts[-1] + 1, starts[-1] + 2))
+        for filename, compressed in ((self.__plain, False), (self.__bgzip, True)):
+            try:
+                vcfindex.build_index(filename)
+            except ValueError:
+                # unsorted files can not be indexed
+                return None
+            for chrom, start, end in regions:
+                expected = [wanted for wanted, record in zip(self.__expected, self.__reference)
+                            if record.CHROM == chrom
+                            and (start is None or recordEnd(record) > start)
+                            and (end is None or record.start < end)]
+                records = Reader(filename=filename, compressed=compressed).fetch(chrom, start, end)
+                failure = self.__compare(map(canonical, records), expected)
+                if failure is not None:
+                    return "fetching %s:%s-%s from %s %s" % (chrom, start, end, path.basename(filename), failure)
+        return None
+
+    def __checkWriter(self):
+        template = Reader(filename=self.__plain)
+        for bulk in (False, True):
+            for records in (self.__reference, Reader(filename=self.__plain, lite_records=True)):
+                stream = io.StringIO()
+                writer = Writer(stream, template)
+                if bulk:
+                    writer.write_records(records)
+                else:
+                    for record in records:
+                        writer.write_record(record)
+                stream.seek(0)
+                failure = self.__compare(map(canonical, Reader(fsock=stream)), self.__expected)
+                if failure is not None:
+                    return ("write_records" if bulk else "write_record") + " " + failure
+
+        expected = ["\t".join(columns) for columns in rawColumns(self.__plain)]
+        for options in ({}, {"lite_records": True}):
+            stream = io.StringIO()
+            Writer(stream, template, passthrough=True).write_records(Reader(filename=self.__plain, raw_lines=True, **options),
+                                                   buffer_lines=2)
+            lines = [line for line in stream.getvalue().split("\n") if line and not line.startswith("#")]
+            failure = self.__compare(lines, expected)
+            if failure is not None:
+                return "passthrough " + failure
+        return None
+
+    def __checkColumns(self):
+        fields = set(sorted(Reader(filename=self.__plain).infos)[1::2])
+        options = [{}, {"filter_pass_only": True}, {"info_fields": fields}]
+        for filename, compressed in ((self.__plain, False), (self.__bgzip, True)):
+            folder = vcfcolumns.convert(filename, compressed)
+            try:
+                for option in options:
+                    text = Reader(filename=filename, compressed=compressed, use_columns=False, **option)
+                    expected = batchRows(text, text.iter_batches(n=3))
+                    reader = Reader(filename=filename, compressed=compressed, **option)
+                    if reader.columnar_copy() is None:
+                        return "no columnar copy of " + path.basename(filename)
+                    failure = self.__compare(batchRows(reader, reader.iter_batches(n=3)), expected)
+                    if failure is not None:
+                        return "with %r from %s %s" % (option, path.basename(filename), failure)
+            finally:
+                shutil.rmtree(folder)
+        return None
+
+
+def batchRows(reader, batches):
+    '''
+    The records of Batch blocks as tuples of their decoded columns, INFO as
+    a sorted list of (key, value) pairs.
+    '''
+    rows = []
+    for batch in batches:
+        for i in range(len(batch.POS)):
+            info = sorted((key, comparable(column[i].item() if hasattr(column[i], "item") else column[i]))
+                          for key, column in batch.INFO.items())
+            rows.append((reader.chrom_codes[batch.CHROM[i]], int(batch.POS[i]), batch.ID[i], batch.REF[i],
+                         batch.ALT[i], comparable(batch.QUAL[i].item()), reader.filter_codes[batch.FILTER[i]], info))
+    return rows
+
+
+def usage():
+    print('parser_conformance.py [-c <corpus folder>] [-n <synthetic records>] [<vcf>...]')
+
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "hc:n:")
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    corpusFolder = CORPUS_FOLDER
+    syntheticRecords = 500
+    for opt, arg in opts:
+        if opt == '-h':
+            usage()
+            sys.exit()
+        elif opt == "-c":
+            corpusFolder = path.abspath(arg)
+        elif opt == "-n":
+            syntheticRecords = int(arg)
+
+    failures = []
+    with tempfile.TemporaryDirectory() as folder:
+        filenames = sorted(glob.glob(path.join(corpusFolder, "*.vcf"))) + [path.abspath(arg) for arg in args]
+        if syntheticRecords > 0:
+            inputs = ParserInputs(path.join(folder, "synthetic"), syntheticRecords, 5)
+            inputs.generate()
+            filenames += [inputs.filename(INFO_FILE), inputs.filename(SAMPLES_FILE)]
+        for filename in filenames:
+            scratch = tempfile.mkdtemp(dir=folder)
+            check = ConformanceCheck(filename, scratch)
+            check.run()
+            failures.extend(check.getFailures())
+    print("%d files checked, %d mismatches" % (len(filenames), len(failures)))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,303 @@
+#!/usr/bin/python
+'''
+Times the subchallenge pipelines on a synthetic cohort, stage by stage:
+
+    parse      reading the VCF (and, for subchallenge 3, expression) files
+    select     VCFFeaturesSelector on every dataset
+    featurize  PatientData.getFullDataframe on every dataset
+    reduce     loading the model columns and transformers and applying them
+    predict    loading the classifiers and scoring the patients
+
+For every stage the wall time, the throughput and the peak resident memory
+so far (of this process and of the worker processes) are reported.
+
+    python -m benchmarks.run_benchmarks -o <cohort folder> [-s <scale>]
+        [-c <1|3>] [-p <processes>] [-r <results.json>] [-b <baseline.json>]
+        [-t <tolerance>] [--patients <n>] [--variants <n>] [--genes <n>] [--main]
+        [--nopanel]
+
+The cohort is generated in the folder unless it already holds one, with the
+1x sizes of benchmarks.synthetic_cohort times the scale, or the sizes given
+(processes only applies to the subchallenge 1 VCF worker pool). As
+subchallenge1.main, subchallenge 1 reads the VCF files restricted to the
+gene panel of the models, unless --nopanel is given. The reduce and predict
+stages are skipped when scikit-learn or the model pickles are missing. With -b
+the stage times are compared with a previous results file and the exit code
+is 1 when any stage got slower than the tolerance (default 1.2x). --main also
+times subchallenge1.main and subchallenge3.main end to end; these read the
+VCF files from /test-data/, so the cohort must be generated there.
+'''
+
+import getopt
+import glob
+import json
+import os
+import os.path as path
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+REPOSITORY_FOLDER = path.dirname(path.dirname(path.realpath(__file__)))
+if REPOSITORY_FOLDER not in sys.path:
+    sys.path.insert(0, REPOSITORY_FOLDER)
+
+from benchmarks.synthetic_cohort import MANIFEST_FILE, SyntheticCohortGenerator
+
+
+def peakRSS():
+    '''
+    Peak resident set size in MB of this process and of its largest child.
+    '''
+    scale = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return own, children
+
+
+class StageTimer(object):
+    '''
+    Runs the stages of a benchmark and records their results. A stage that
+    raises is recorded as failed and the stages depending on it as skipped,
+    so a missing model file does not hide the timings of the earlier stages.
+    '''
+
+    def __init__(self):
+        self.__results = []
+
+    def getResults(self):
+        return self.__results
+
+    def run(self, benchmark, stage, items, unit, function, *args):
+        result = {"benchmark": benchmark, "stage": stage, "items": items, "unit": unit}
+        start = time.perf_counter()
+        try:
+            value = function(*args)
+            result["status"] = "ok"
+        except Exception as e:
+            value = None
+            result["status"] = "failed"
+            result["error"] = type(e).__name__ + ": " + str(e)
+        result["seconds"] = time.perf_counter() - start
+        result["throughput"] = items / result["seconds"] if result["status"] == "ok" and result["seconds"] > 0 else None
+        result["peakRSSMB"], result["peakChildRSSMB"] = peakRSS()
+        self.__results.append(result)
+        return value
+
+    def skip(self, benchmark, stage, reason):
+        self.__results.append({"benchmark": benchmark, "stage": stage, "status": "skipped", "error": reason})
+
+    def report(self):
+        print("=" * 100)
+        print("%-6s %-10s %10s %16s %22s %10s %10s  %s" % (
+            "bench", "stage", "seconds", "items", "throughput", "RSS MB", "child MB", "status"))
+        for r in self.__results:
+            if r["status"] == "skipped":
+                print("%-6s %-10s %10s %16s %22s %10s %10s  skipped (%s)" % (
+                    r["benchmark"], r["stage"], "-", "-", "-", "-", "-", r["error"]))
+                continue
+            throughput = "-" if r["throughput"] is None else "%.1f %s/s" % (r["throughput"], r["unit"])
+            status = r["status"] if r["status"] == "ok" else r["status"] + " (" + r["error"][:60] + ")"
+            print("%-6s %-10s %10.3f %16s %22s %10.1f %10.1f  %s" % (
+                r["benchmark"], r["stage"], r["seconds"], "%d %s" % (r["items"], r["unit"]), throughput,
+                r["peakRSSMB"], r["peakChildRSSMB"], status))
+        print("=" * 100)
+
+
+def modelStageBlockers(challenge):
+    '''
+    The reasons the reduce and predict stages of a subchallenge ("CH1" or
+    "CH3") can not run here, by stage: the transformers and classifiers are
+    scikit-learn pickles, and the classifiers are not in every checkout.
+    '''
+    try:
+        import sklearn
+    except ImportError:
+        return {"reduce": "scikit-learn is not installed", "predict": "scikit-learn is not installed"}
+    if not glob.glob(path.join(REPOSITORY_FOLDER, "serialized_models", "*_Classifier_" + challenge + ".pkl")):
+        return {"predict": "no *_Classifier_" + challenge + ".pkl model pickles in serialized_models/"}
+    return {}
+
+
+def benchmarkModelStages(benchmark, timer, datasets, predictor, patients, blockers):
+    from preprocessor.vcf_features_selector import VCFFeaturesSelector
+
+    def select(datasets):
+        return {k: VCFFeaturesSelector(d).generateFilteredData() for k, d in datasets.items()}
+
+    def featurize(selected):
+        return {k: d.getFullDataframe(False, False) for k, d in selected.items()}
+
+    def reduce(dataframes):
+        return {k: predictor.reduce_dataset(X, k) for k, X in dataframes.items()}
+
+    def predict(reduced):
+        return {k: predictor.predict_reduced(x, k) for k, x in reduced.items()}
+
+    value = datasets
+    for stage, function in (("select", select), ("featurize", featurize), ("reduce", reduce),
+                            ("predict", predict)):
+        if stage in blockers:
+            print("Skipping the " + benchmark + " " + stage + " stage: " + blockers[stage])
+            timer.skip(benchmark, stage, blockers[stage])
+            value = None
+            continue
+        if value is None:
+            timer.skip(benchmark, stage, "previous stage failed")
+            continue
+        value = timer.run(benchmark, stage, patients, "patients", function, value)
+
+
+def benchmarkSubchallenge1(manifest, timer, processes, usePanel):
+    from machinelearning.vcf_model_predictor import VCFModelPredictor
+    from preprocessor.vcf_data_preprocessing import VCFDataPreprocessor
+
+    preprocessor = VCFDataPreprocessor(manifest["clinical"], cacheFolder=None, processes=processes,
+                                       usePanel=usePanel)
+    datasets = timer.run("sc1", "parse", manifest["variants"], "variants",
+                         preprocessor.getPatientDataByDataset, manifest["folder"] + "/", True)
+    benchmarkModelStages("sc1", timer, datasets, VCFModelPredictor(), manifest["patients"],
+                         modelStageBlockers("CH1"))
+
+
+def benchmarkSubchallenge3(manifest, timer):
+    try:
+        from machinelearning.all_model_predictor import AllModelPredictor
+        from preprocessor.all_data_preprocessing import AllDataPreprocessor
+    except ImportError as e:
+        timer.skip("sc3", "parse", "import failed: " + str(e))
+        return
+
+    with tempfile.TemporaryDirectory() as cacheFolder:
+        preprocessor = AllDataPreprocessor(manifest["clinical"], cacheFolder)
+        datasets = timer.run("sc3", "parse", manifest["variants"], "variants",
+                             preprocessor.getPatientDataByDataset, manifest["folder"] + "/")
+    benchmarkModelStages("sc3", timer, datasets, AllModelPredictor(), manifest["patients"],
+                         modelStageBlockers("CH3"))
+
+
+def benchmarkMains(manifest, timer):
+    for benchmark, moduleName in (("sc1", "subchallenge1"), ("sc3", "subchallenge3")):
+        if path.abspath(manifest["folder"]) != path.abspath("/test-data"):
+            timer.skip(benchmark, "main", "cohort is not in /test-data/")
+            continue
+        try:
+            module = __import__(moduleName)
+        except ImportError as e:
+            timer.skip(benchmark, "main", "import failed: " + str(e))
+            continue
+        with tempfile.TemporaryDirectory() as outputFolder:
+            timer.run(benchmark, "main", manifest["patients"], "patients", module.main,
+                      ["-i", manifest["clinical"], "-o", path.join(outputFolder, "predictions.tsv")])
+        os.chdir(REPOSITORY_FOLDER)
+
+
+def compareWithBaseline(results, baselineFile, tolerance):
+    with open(baselineFile) as f:
+        baseline = json.load(f)
+    baselineTimes = {(r["benchmark"], r["stage"]): r["seconds"]
+                     for r in baseline["results"] if r["status"] == "ok"}
+    regressions = []
+    print("Comparison with " + baselineFile + " (tolerance " + str(tolerance) + "x):")
+    for r in results:
+        key = (r["benchmark"], r["stage"])
+        if r["status"] != "ok" or key not in baselineTimes or baselineTimes[key] <= 0:
+            continue
+        ratio = r["seconds"] / baselineTimes[key]
+        flag = ""
+        if ratio > tolerance:
+            flag = "  <-- regression"
+            regressions.append(key)
+        print("%-6s %-10s %10.3f -> %10.3f  %.2fx%s" % (key[0], key[1], baselineTimes[key], r["seconds"], ratio, flag))
+    return regressions
+
+
+def usage():
+    print('run_benchmarks.py -o <cohort folder> [-s <scale>] [-c <1|3>] [-p <processes>] [-r <results.json>] '
+          '[-b <baseline.json>] [-t <tolerance>] [--main] [--nopanel]')
+
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "ho:s:c:p:r:b:t:", ["main", "nopanel", "patients=", "variants=", "genes="])
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    cohortFolder = None
+    scale = 1
+    sizes = {}
+    challenges = ["1", "3"]
+    processes = None
+    resultsFile = None
+    baselineFile = None
+    tolerance = 1.2
+    timeMains = False
+    usePanel = True
+    for opt, arg in opts:
+        if opt == '-h':
+            usage()
+            sys.exit()
+        elif opt == "-o":
+            cohortFolder = path.abspath(arg)
+        elif opt == "-s":
+            scale = float(arg)
+        elif opt == "-c":
+            challenges = arg.split(",")
+        elif opt == "-p":
+            processes = int(arg)
+        elif opt == "-r":
+            resultsFile = path.abspath(arg)
+        elif opt == "-b":
+            baselineFile = path.abspath(arg)
+        elif opt == "-t":
+            tolerance = float(arg)
+        elif opt == "--main":
+            timeMains = True
+        elif opt == "--nopanel":
+            usePanel = False
+        elif opt == "--patients":
+            sizes["patients"] = int(arg)
+        elif opt == "--variants":
+            sizes["variantsPerFile"] = int(arg)
+        elif opt == "--genes":
+            sizes["genes"] = int(arg)
+    if cohortFolder is None:
+        usage()
+        sys.exit(2)
+
+    # the pipelines read their serialized features and models relative to the repository
+    os.chdir(REPOSITORY_FOLDER)
+    manifestFile = path.join(cohortFolder, MANIFEST_FILE)
+    if path.exists(manifestFile):
+        print("Using the synthetic cohort in " + cohortFolder)
+        with open(manifestFile) as f:
+            manifest = json.load(f)
+    else:
+        print("Generating a synthetic cohort in " + cohortFolder + "...")
+        start = time.perf_counter()
+        manifest = SyntheticCohortGenerator(cohortFolder, scale, **sizes).generate()
+        print("Generated in %.1f seconds" % (time.perf_counter() - start))
+    print("Patients: %(patients)d, VCF files: %(vcfFiles)d, variants: %(variants)d, genes: %(genes)d" % manifest)
+
+    timer = StageTimer()
+    if "1" in challenges:
+        benchmarkSubchallenge1(manifest, timer, processes, usePanel)
+    if "3" in challenges:
+        benchmarkSubchallenge3(manifest, timer)
+    if timeMains:
+        benchmarkMains(manifest, timer)
+    timer.report()
+
+    if resultsFile is not None:
+        with open(resultsFile, 'w') as f:
+            json.dump({"cohort": manifest, "python": platform.python_version(), "machine": platform.machine(),
+                       "cpus": os.cpu_count(), "processes": processes, "usePanel": usePanel,
+                       "results": timer.getResults()}, f, indent=2)
+        print("Results written to " + resultsFile)
+    if baselineFile is not None and compareWithBaseline(timer.getResults(), baselineFile, tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,229 @@
+import gzip
+import json
+import os
+import os.path as path
+import pickle
+import random
+
+import numpy as np
+import pandas as pd
+
+from preprocessor.vcf_data_preprocessing import CYTOGENETICS_PROPS
+from readers.bgzf import BgzfWriter
+
+
+FILTERING_FILE = "serialized_features/filteringGenesAndFunctions.pkl"
+SCORING_FEATURES_FILES = ["serialized_features/MuTectsnvs_filtered_genesScoring_featColumns_CH1.pkl",
+                          "serialized_features/Strelkasnvs_filtered_genesScoring_featColumns_CH1.pkl"]
+RNASEQ_GENES_FILE = "RNASeq_genes_08112017"
+MA_GENES_FILE = "MA_genes_08112017"
+
+MANIFEST_FILE = "cohort.json"
+CLINICAL_FILE = "clinical.csv"
+
+# Sizes of the 1x cohort; every scale multiplies them
+BASE_PATIENTS = 40
+BASE_VARIANTS = 5000
+BASE_GENES = 2000
+
+STUDIES = ["MMRF", "DFCI", "UAMS"]
+IMPACTS = ["HIGH", "MODERATE", "LOW", "MODIFIER"]
+FILTERS = ["PASS", "PASS", "PASS", "clustered_events", "clustered_events;t_lod_fstar", "germline_risk"]
+
+VCF_COLUMNS = {
+    "WES_mutationFileMutect": "mutect",
+    "WES_mutationFileStrelkaSNV": "strelka",
+    "RNASeq_mutationFileMutect": "mutect",
+    "RNASeq_mutationFileStrelkaSNV": "strelka"
+}
+# There are no serialized features for the Strelka indel calls, so these
+# columns are left empty
+EMPTY_VCF_COLUMNS = ["WES_mutationFileStrelkaIndel", "RNASeq_mutationFileStrelkaIndel"]
+
+VCF_HEADER = '''##fileformat=VCFv4.1
+##FILTER=<ID=PASS,Description="All filters passed">
+##FILTER=<ID=clustered_events,Description="Clustered events observed in the tumor">
+##FILTER=<ID=t_lod_fstar,Description="Tumor does not meet likelihood threshold">
+##FILTER=<ID=germline_risk,Description="Evidence indicates this site is germline, not somatic">
+##INFO=<ID=ANN,Number=.,Type=String,Description="Functional annotations: 'Allele | Annotation | Annotation_Impact | Gene_Name | Gene_ID | Feature_Type | Feature_ID | Transcript_BioType | Rank | HGVS.c | HGVS.p | cDNA.pos / cDNA.length | CDS.pos / CDS.length | AA.pos / AA.length | Distance | ERRORS / WARNINGS / INFO'">
+##INFO=<ID=DB,Number=0,Type=Flag,Description="dbSNP Membership">
+##INFO=<ID=SAO,Number=1,Type=Integer,Description="Variant Allele Origin: 0 - unspecified, 1 - Germline, 2 - Somatic, 3 - Both">
+'''
+
+MUTECT_HEADER = '''##INFO=<ID=TLOD,Number=1,Type=Float,Description="Tumor LOD score">
+##INFO=<ID=NLOD,Number=1,Type=Float,Description="Normal LOD score">
+##INFO=<ID=ECNT,Number=1,Type=Integer,Description="Number of events in this haplotype">
+##INFO=<ID=HCNT,Number=1,Type=Integer,Description="Number of haplotypes that support this variant">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths for the ref and alt alleles">
+'''
+
+STRELKA_HEADER = '''##INFO=<ID=QSS,Number=1,Type=Integer,Description="Quality score for any somatic snv">
+##INFO=<ID=QSS_NT,Number=1,Type=Integer,Description="Quality score reflecting the joint probability of a somatic variant and NT">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read depth">
+##FORMAT=<ID=AU,Number=2,Type=Integer,Description="Number of 'A' alleles used in tiers 1,2">
+'''
+
+CHROMOSOMES = [str(c) for c in range(1, 23)] + ["X", "Y"]
+
+
+class SyntheticCohortGenerator(object):
+    '''
+    Writes a synthetic challenge cohort to outputFolder: a clinical CSV with
+    the WES_/RNASeq_ mutation file columns, the MA_/RNASeq_ expression file
+    columns and the cytogenetic features, one bgzipped (gzipped with
+    bgzip=False) VCF per patient and mutation file column (MuTect or Strelka
+    style, annotated with ANN) and one gene level expression matrix per
+    study and platform.
+
+    Gene names, functions and expression gene ids are drawn from the features
+    the serialized models were trained on, so the selection and reduction
+    stages see realistic overlaps. The number of patients, variants per VCF
+    and genes in the VCF gene pool are the 1x sizes times scale, unless given.
+    '''
+
+    def __init__(self, outputFolder, scale=1, patients=None, variantsPerFile=None, genes=None, seed=0,
+                 bgzip=True):
+        self.__outputFolder = outputFolder
+        self.__bgzip = bgzip
+        self.__patients = patients or int(BASE_PATIENTS * scale)
+        self.__variantsPerFile = variantsPerFile or int(BASE_VARIANTS * scale)
+        self.__genes = genes or int(BASE_GENES * scale)
+        self.__seed = seed
+
+    def generate(self):
+        '''
+        Writes the cohort and returns its manifest, which is also saved as
+        cohort.json next to the clinical file.
+        '''
+        os.makedirs(self.__outputFolder, exist_ok=True)
+        rng = random.Random(self.__seed)
+        nprng = np.random.RandomState(self.__seed)
+        genePool = self.__genePool()
+        with open(FILTERING_FILE, 'rb') as f:
+            functions = sorted(pickle.load(f)["functions"])
+        functions = [function for function in functions if "|" not in function and "," not in function]
+
+        clinical = self.__clinicalData(nprng)
+        variants = 0
+        for column, caller in VCF_COLUMNS.items():
+            for patient, filename in clinical[column].dropna().items():
+                self.__writeVCF(path.join(self.__outputFolder, filename), caller, genePool, functions, rng)
+                variants += self.__variantsPerFile
+        expressionGenes = self.__writeExpressionFiles(clinical, nprng)
+        clinical.to_csv(path.join(self.__outputFolder, CLINICAL_FILE), index=False)
+
+        manifest = {
+            "clinical": path.abspath(path.join(self.__outputFolder, CLINICAL_FILE)),
+            "folder": path.abspath(self.__outputFolder),
+            "patients": self.__patients,
+            "variantsPerFile": self.__variantsPerFile,
+            "genes": self.__genes,
+            "vcfFiles": int(sum(clinical[column].notnull().sum() for column in VCF_COLUMNS)),
+            "variants": variants,
+            "expressionGenes": expressionGenes,
+            "seed": self.__seed,
+            "bgzip": self.__bgzip
+        }
+        with open(path.join(self.__outputFolder, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    def __genePool(self):
+        genes = []
+        for filename in SCORING_FEATURES_FILES:
+            with open(filename, 'rb') as f:
+                genes.extend(pickle.load(f))
+        with open(FILTERING_FILE, 'rb') as f:
+            genes.extend(sorted(pickle.load(f)["genes"]))
+        genes = list(pd.unique(pd.Series(genes)))
+        if len(genes) < self.__genes:
+            genes.extend("SYNTH%06d" % i for i in range(self.__genes - len(genes)))
+        return genes[:self.__genes]
+
+    def __clinicalData(self, nprng):
+        patients = ["SYN_%05d" % i for i in range(self.__patients)]
+        clinical = pd.DataFrame({
+            "Patient": patients,
+            "Study": [STUDIES[i % len(STUDIES)] for i in range(self.__patients)],
+            "D_Age": nprng.randint(35, 90, self.__patients),
+            "D_ISS": nprng.randint(1, 4, self.__patients),
+            "HR_FLAG": nprng.choice(["TRUE", "FALSE", "CENSORED"], self.__patients, p=[0.3, 0.6, 0.1])
+        }, index=patients)
+        for column in VCF_COLUMNS:
+            prefix = column.split("_")[0]
+            present = nprng.rand(self.__patients) < (0.8 if prefix == "WES" else 0.4)
+            clinical[column] = [(patient + "_" + column.split("mutationFile")[1] + "_" + prefix + ".FILTERED.vcf.gz")
+                                if p else np.nan for patient, p in zip(patients, present)]
+        for platform, extension in (("RNASeq", "tsv"), ("MA", "csv")):
+            present = nprng.rand(self.__patients) < 0.5
+            clinical[platform + "_geneLevelExpFile"] = [
+                (platform + "_" + study + "_genes." + extension) if p else np.nan
+                for study, p in zip(clinical["Study"], present)]
+            clinical[platform + "_geneLevelExpFileSamplId"] = [
+                ("S_" + patient) if p else np.nan for patient, p in zip(patients, present)]
+        for column in EMPTY_VCF_COLUMNS + ["RNASeq_transLevelExpFile", "RNASeq_transLevelExpFileSamplId",
+                       "MA_probeLevelExpFile", "MA_probeLevelExpFileSamplId"]:
+            clinical[column] = np.nan
+        for column in CYTOGENETICS_PROPS:
+            clinical[column] = nprng.randint(0, 2, self.__patients)
+        return clinical
+
+    def __writeVCF(self, filename, caller, genePool, functions, rng):
+        lines = [VCF_HEADER, MUTECT_HEADER if caller == "mutect" else STRELKA_HEADER]
+        lines.append("##contig=<ID=" + ">\n##contig=<ID=".join(CHROMOSOMES) + ">\n")
+        if caller == "mutect":
+            lines.append("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tTUMOR\tNORMAL\n")
+        else:
+            lines.append("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tNORMAL\tTUMOR\n")
+        perChromosome = max(1, self.__variantsPerFile // len(CHROMOSOMES))
+        pos = 0
+        for i in range(self.__variantsPerFile):
+            chrom = CHROMOSOMES[min(i // perChromosome, len(CHROMOSOMES) - 1)]
+            pos = rng.randint(1, 1000) if i % perChromosome == 0 else pos + rng.randint(1, 20000)
+            ref, alt = rng.sample("ACGT", 2)
+            annotations = []
+            for _ in range(rng.randint(1, 3)):
+                function = rng.choice(functions)
+                gene = rng.choice(genePool)
+                annotations.append("|".join([alt, function, rng.choice(IMPACTS), gene, gene, "transcript",
+                                             "ENST%011d" % rng.randint(0, 10 ** 6), "protein_coding", "1/5",
+                                             "c.%d%s>%s" % (rng.randint(1, 5000), ref, alt), "", "", "", "", "", ""]))
+            info = ["ANN=" + ",".join(annotations)]
+            if caller == "mutect":
+                info += ["ECNT=%d" % rng.randint(1, 3), "HCNT=%d" % rng.randint(0, 4),
+                         "NLOD=%.2f" % rng.uniform(0, 30), "TLOD=%.2f" % rng.uniform(0, 60)]
+                sample = "GT:AD\t0/1:%d,%d\t0/0:%d,0" % (rng.randint(5, 80), rng.randint(2, 40), rng.randint(5, 80))
+            else:
+                info += ["QSS=%d" % rng.randint(0, 60), "QSS_NT=%d" % rng.randint(0, 60)]
+                sample = "DP:AU\t%d:%d,%d\t%d:%d,%d" % (rng.randint(5, 80), rng.randint(0, 40), rng.randint(0, 40),
+                                                      rng.randint(5, 80), rng.randint(0, 40), rng.randint(0, 40))
+            if rng.random() < 0.2:
+                info.append("SAO=%d" % rng.randint(0, 3))
+            if rng.random() < 0.3:
+                info.append("DB")
+            lines.append("\t".join([chrom, str(pos), "rs%d" % rng.randint(1, 10 ** 8) if rng.random() < 0.3 else ".",
+                                    ref, alt, ".", rng.choice(FILTERS), ";".join(sorted(info)), sample]) + "\n")
+        data = "".join(lines).encode("ascii")
+        if self.__bgzip:
+            writer = BgzfWriter(open(filename, 'wb'))
+            writer.write(data)
+            writer.close()
+        else:
+            with gzip.open(filename, 'wb') as f:
+                f.write(data)
+
+    def __writeExpressionFiles(self, clinical, nprng):
+        expressionGenes = 0
+        for platform, genesFile, sep in (("RNASeq", RNASEQ_GENES_FILE, "\t"), ("MA", MA_GENES_FILE, ",")):
+            with open(genesFile, 'rb') as f:
+                genes = list(pickle.load(f))
+            expressionGenes = max(expressionGenes, len(genes))
+            fileColumn = platform + "_geneLevelExpFile"
+            samples = clinical.dropna(subset=[fileColumn])
+            for filename, group in samples.groupby(fileColumn):
+                values = nprng.lognormal(2, 1, size=(len(genes), len(group))).astype(np.float32)
+                expression = pd.DataFrame(values, index=pd.Index(genes, name="GeneId"),
+                                          columns=group[fileColumn + "SamplId"].values)
+                expression.to_csv(path.join(self.__outputFolder, filename), sep=sep, float_format="%.4f")
+        return expressionGenes
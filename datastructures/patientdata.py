@@ -169,7 +169,12 @@ class PatientData(object):
         else:
             raise Exception("Genes rnaseq must be a dataframe")  
     
-    def getFullDataframe(self, withPatients=True, withFlags=True, withCytogenetics=True):
+    def getFullDataframe(self, withPatients=True, withFlags=True, withCytogenetics=True, dense=True):
+        '''
+        Joins every feature group into one dataframe. The VCF feature groups
+        are kept with sparse columns until here; dense=True (the default)
+        returns them as ordinary columns, as expected by the models.
+        '''
         fulldf = [self.__patients.copy()]
         if self.__ages is not None:
             fulldf.append(self.__ages)
@@ -202,8 +207,21 @@ class PatientData(object):
             fulldf.append(self.__genes_rnaseq)
         if self.__flags is not None and withFlags:
             fulldf.append(self.__flags)
+        if dense:
+            fulldf = [self.__toDense(df) for df in fulldf]
         print(fulldf)
         fulldf = pd.concat(fulldf, axis=1)
         if not withPatients:
             fulldf.drop("Patient", axis=1, inplace=True)
-        return fulldf
\ No newline at end of file
+        return fulldf
+
+    def __toDense(self, dataframe):
+        if not isinstance(dataframe, pd.DataFrame):
+            return dataframe
+        sparseColumns = [isinstance(dtype, pd.SparseDtype) for dtype in dataframe.dtypes]
+        if not any(sparseColumns):
+            return dataframe
+        if all(sparseColumns):
+            return dataframe.sparse.to_dense()
+        return dataframe.apply(lambda column: column.sparse.to_dense()
+                               if isinstance(column.dtype, pd.SparseDtype) else column)
\ No newline at end of file
@@ -82,21 +82,20 @@ class VCFModelPredictor(object):
         }
     
     def generate_predictions_scores(self, dataset, modelType):
+        x = self.reduce_dataset(dataset, modelType)
+        return self.predict_reduced(x, modelType)
+    
+    def reduce_dataset(self, dataset, modelType):
         if modelType in self.__exploited_models.keys():
             modelType = self.__exploited_models[modelType]
         
-        print("Starting reading model Files...")
+        print("Starting reading model columns...")
         f = open(self.__trained_Models[modelType]["__columnsDic"], 'rb')
         featColumns = pickle.load(f);
         f.close();
         
-        f = open(self.__trained_Models[modelType]["__classifierFilename"], 'rb')
-        clf = pickle.load(f)
-        f.close();
-        
-        print("Finished reading model Files...")
         print("Starting reducing dataframe for prediction...")
-        dataset = dataset.loc[:, featColumns]
+        dataset = dataset.reindex(columns=featColumns)
         print("Overlapping columns from prediction data for reducion")
         valuecounts = dataset.isnull().all().value_counts()
         print(valuecounts)
@@ -109,6 +108,18 @@ class VCFModelPredictor(object):
         print("Columns selected on reduced dataset: " + str(reducedDataset.columns))
         print("Finished reducing dataframe for prediction...")
         print("Dataset rows: " + str(len(dataset.index)))
+        return x
+    
+    def predict_reduced(self, x, modelType):
+        if modelType in self.__exploited_models.keys():
+            modelType = self.__exploited_models[modelType]
+        
+        print("Starting reading model Files...")
+        f = open(self.__trained_Models[modelType]["__classifierFilename"], 'rb')
+        clf = pickle.load(f)
+        f.close();
+        
+        print("Finished reading model Files...")
         print("Starting to predict labels...")
         predictions = clf.predict(x)
         predictionscores = clf.predict_proba(x)
@@ -1,13 +1,15 @@
 from datastructures.patientdata import PatientData
 from load_ch2_data import get_ch2_data
-import numpy as np
 import pandas as pd
-from preprocessor.vcf_data_preprocessing import VCFDataPreprocessor
+from preprocessor.vcf_data_preprocessing import VCFDataPreprocessor, VCF_CACHE_FOLDER
+from preprocessor.vcf_feature_matrix import concatBinaryColumns, mergeBinaryColumns
 from preprocessor.vcf_features_selector import VCFFeaturesSelector
 
 
 class AllDataPreprocessor(object):
-	def __init__(self, submissionfile):
+	def __init__(self, submissionfile, cacheFolder=VCF_CACHE_FOLDER, usePanel=False):
+		self.__cacheFolder = cacheFolder
+		self.__usePanel = usePanel
 		if submissionfile is not None:
 			self.__submissionfile = submissionfile
 			self.__clinicalData = pd.read_csv(submissionfile)
@@ -18,7 +20,7 @@ class AllDataPreprocessor(object):
 		return self.__clinicalData
 
 	def __addVCFInformation(self, directoryFolder, useFiltered, forTraining, groupAges):
-		vcfpreprocessor = VCFDataPreprocessor(self.__submissionfile)
+		vcfpreprocessor = VCFDataPreprocessor(self.__submissionfile, self.__cacheFolder, usePanel=self.__usePanel)
 		result = vcfpreprocessor.getPatientDataByDataset(directoryFolder, useFiltered, forTraining, groupAges)
 		return result
 
@@ -279,28 +281,28 @@ class AllDataPreprocessor(object):
 			if genes_scoring is None:
 				genes_scoring = dataset.get_genes_scoring()
 			else:
-				genes_scoring = pd.concat([genes_scoring, dataset.get_genes_scoring()], axis=1)
+				genes_scoring = concatBinaryColumns([genes_scoring, dataset.get_genes_scoring()])
 
 			if genes_function_associated is None:
 				genes_function_associated = dataset.get_genes_function_associated()
 			else:
-				genes_function_associated = pd.concat(
-					[genes_function_associated, dataset.get_genes_function_associated()], axis=1)
+				genes_function_associated = concatBinaryColumns(
+					[genes_function_associated, dataset.get_genes_function_associated()])
 
 			if tlod is None:
 				tlod = dataset.get_genes_tlod()
 			elif dataset.get_genes_tlod() is not None:
-				tlod = pd.concat([tlod, dataset.get_genes_tlod()], axis=1)
+				tlod = concatBinaryColumns([tlod, dataset.get_genes_tlod()])
 
 			if qss is None:
 				qss = dataset.get_genes_qss()
 			elif dataset.get_genes_qss() is not None:
-				qss = pd.concat([qss, dataset.get_genes_qss()], axis=1)
+				qss = concatBinaryColumns([qss, dataset.get_genes_qss()])
 
 			if big_qss is None:
 				big_qss = dataset.get_genes_big_qss()
 			elif dataset.get_genes_big_qss() is not None:
-				big_qss = pd.concat([big_qss, dataset.get_genes_big_qss()], axis=1)
+				big_qss = concatBinaryColumns([big_qss, dataset.get_genes_big_qss()])
 
 			if cytogenetic_features is None:
 				cytogenetic_features = dataset.get_cytogenetic_features()
@@ -310,17 +312,17 @@ class AllDataPreprocessor(object):
 			if clustered is None:
 				clustered = dataset.get_genes_clustered()
 			elif dataset.get_genes_clustered() is not None:
-				clustered = pd.concat([clustered, dataset.get_genes_clustered()], axis=1)
+				clustered = concatBinaryColumns([clustered, dataset.get_genes_clustered()])
 
 			if germline is None:
 				germline = dataset.get_genes_germline_risk()
 			elif dataset.get_genes_germline_risk() is not None:
-				germline = pd.concat([germline, dataset.get_genes_germline_risk()], axis=1)
+				germline = concatBinaryColumns([germline, dataset.get_genes_germline_risk()])
 
 			if somaticrisk is None:
 				somaticrisk = dataset.get_genes_somatic_risk()
 			elif dataset.get_genes_somatic_risk() is not None:
-				somaticrisk = pd.concat([somaticrisk, dataset.get_genes_somatic_risk()], axis=1)
+				somaticrisk = concatBinaryColumns([somaticrisk, dataset.get_genes_somatic_risk()])
 
 			if flags is None:
 				flags = dataset.get_flags()
@@ -389,12 +391,7 @@ class AllDataPreprocessor(object):
 		return dataframe
 
 	def __processBinaryGroupedDataFrame(self, dataframe):
-		dataframe = dataframe.groupby(dataframe.columns, axis=1).sum()
-		dataframe[dataframe > 1] = 1
-		dataframe[dataframe == 0] = np.nan
-		dataframe = dataframe.dropna(axis=1, how='all')
-		dataframe = dataframe.fillna(value=0)
-		return dataframe
+		return mergeBinaryColumns(dataframe)
 
 	def __addDatasetNameToDataframe(self, dataframe, dataset):
 		if dataframe is not None:
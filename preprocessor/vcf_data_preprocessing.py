@@ -1,13 +1,22 @@
-import multiprocessing
+from collections import OrderedDict
+import json
+import os
 
 from datastructures.patientdata import PatientData
 import os.path as path
 import pandas as pd
 import numpy as np
-from preprocessor.vcf_features_selector import VCFFeaturesSelector
+from preprocessor.vcf_feature_matrix import appendBinaryRows, buildSparseFeatureMatrix, sparseMatrixToDataframe
+from preprocessor.vcf_features_selector import VCFFeaturesSelector, loadGenePanel
+from readers.vcfcache import VCFFeatureCache
+from readers.vcfpool import VCFWorkerPool
 from readers.vcfreader import VCFReader
 
 
+# VCF feature groups of PatientData, by their getter and setter suffix
+VCF_FEATURE_GROUPS = ["genes_scoring", "genes_function_associated", "genes_tlod", "genes_qss", "genes_big_qss",
+                      "genes_clustered", "genes_germline_risk", "genes_somatic_risk"]
+
 GENOMIC_PROPS = {
     "MuTectsnvs" : "WES_mutationFileMutect",
     "StrelkaIndels" : "WES_mutationFileStrelkaIndel",
@@ -25,22 +34,113 @@ CYTOGENETICS_PROPS = ["CYTO_predicted_feature_01","CYTO_predicted_feature_02","C
                       "CYTO_predicted_feature_16","CYTO_predicted_feature_17","CYTO_predicted_feature_18"
                       ]
 
+VCF_CACHE_FOLDER = 'vcf_cache'
+# VCF files that could not be read, with their errors, kept in the cache folder
+QUARANTINE_FILE = 'quarantine.json'
+
 class VCFDataPreprocessor(object):
     
-    def __init__(self, submissionfile):
+    def __init__(self, submissionfile, cacheFolder=VCF_CACHE_FOLDER, processes=None, maxtasksperchild=None,
+                 usePanel=False, fileTimeout=None, scratchTransfer=False):
         if submissionfile is not None:
             self.__clinicalData = pd.read_csv(submissionfile)
             self.__clinicalData["Patient Index"] = self.__clinicalData.index
             self.__clinicalData.index = self.__clinicalData["Patient"]
-        self.__executor = multiprocessing.Pool(processes=multiprocessing.cpu_count()-1)
+        self.__cacheFolder = cacheFolder
+        self.__processes = processes
+        self.__maxtasksperchild = maxtasksperchild
+        # only the genes of the selected features are read, which is enough
+        # for predictions but not for training
+        self.__panel = loadGenePanel() if usePanel else None
+        self.__fileTimeout = fileTimeout
+        # the workers hand the feature groups back through shared memory
+        # instead of pickling them (see VCFWorkerPool)
+        self.__scratchTransfer = scratchTransfer
+        self.__quarantine = {}
     
     def getClinicalData(self):
         return self.__clinicalData;
+
+    def getQuarantine(self):
+        '''
+        The VCF files the last run could not read, with their errors: the
+        files that raised, took longer than fileTimeout seconds or brought
+        their worker down. Their patients are left out of the datasets; as
+        the files read are cached, a rerun only parses these files again.
+        '''
+        return self.__quarantine
     
     def getPatientDataByDataset(self, directoryFolder='/test-data/', useFiltered=False, forTraining=False, groupAges=False):
+        selectedDatasets = self.__selectDatasets(directoryFolder, useFiltered, forTraining)
+
+        # The files of all datasets are read as a single job, so workers are
+        # not left idle at the end of each dataset
+        allPaths = [p for selected in selectedDatasets for p in selected[4]]
+        vcfFeaturesByPath = self.__readVCFFiles(self.__featureCache(), allPaths)
+
         result = {}
-        reader = VCFReader()
-        
+        for dataset, dataset_origin, datasetDataframe, filenames, paths in self.__withoutQuarantined(
+                directoryFolder, selectedDatasets):
+            data = self.__buildPatientData(dataset, dataset_origin, datasetDataframe, filenames, paths,
+                                           vcfFeaturesByPath, forTraining, groupAges)
+            if self.__keepDataset(dataset_origin, data):
+                result[dataset_origin] = data
+
+        return result
+
+    def extendPatientDataByDataset(self, patientDataByDataset, directoryFolder='/test-data/', useFiltered=False,
+                                   forTraining=False, groupAges=False):
+        '''
+        Incremental getPatientDataByDataset: extends its result for an
+        earlier version of the clinical file (e.g. unpickled from a previous
+        run) with the patients of the current clinical file it does not hold
+        yet. Only the VCF files of the new patients are read, and their rows
+        are appended below the existing ones, new features becoming new
+        columns. Patients already present are left as they are.
+        '''
+        selectedDatasets = []
+        for dataset, dataset_origin, datasetDataframe, filenames, paths in self.__selectDatasets(
+                directoryFolder, useFiltered, forTraining):
+            existing = patientDataByDataset.get(dataset_origin)
+            if existing is not None:
+                datasetDataframe = datasetDataframe[~datasetDataframe["Patient"].isin(existing.get_patients())]
+                if datasetDataframe.empty:
+                    continue
+                filenames, paths = self.__datasetPaths(directoryFolder, dataset, datasetDataframe)
+            selectedDatasets.append((dataset, dataset_origin, datasetDataframe, filenames, paths))
+
+        allPaths = [p for selected in selectedDatasets for p in selected[4]]
+        vcfFeaturesByPath = self.__readVCFFiles(self.__featureCache(), allPaths)
+
+        result = dict(patientDataByDataset)
+        for dataset, dataset_origin, datasetDataframe, filenames, paths in self.__withoutQuarantined(
+                directoryFolder, selectedDatasets):
+            data = self.__buildPatientData(dataset, dataset_origin, datasetDataframe, filenames, paths,
+                                           vcfFeaturesByPath, forTraining, groupAges)
+            if dataset_origin in result:
+                data = self.__appendPatientData(result[dataset_origin], data)
+            if self.__keepDataset(dataset_origin, data):
+                result[dataset_origin] = data
+
+        return result
+
+    def __keepDataset(self, dataset_origin, data):
+        '''
+        A dataset none of whose genes reaches the scoring threshold is left
+        out, as it holds no usable VCF data.
+        '''
+        if not data.get_genes_scoring().empty:
+            return True
+        print("Dataset left out, no gene reaches the scoring threshold: " + dataset_origin)
+        return False
+
+    def __featureCache(self):
+        if self.__cacheFolder is None:
+            return None
+        return VCFFeatureCache(self.__cacheFolder, VCFReader(panel=self.__panel).getFeaturesFingerprint())
+
+    def __selectDatasets(self, directoryFolder, useFiltered, forTraining):
+        selectedDatasets = []
         for dataset in GENOMIC_PROPS.keys():
             dataset_origin = dataset
             datasetDataframe = self.__clinicalData[self.__clinicalData[GENOMIC_PROPS[dataset]].notnull()].copy()
@@ -52,78 +152,174 @@ class VCFDataPreprocessor(object):
                 valid_samples = datasetDataframe["HR_FLAG"] != "CENSORED"
                 datasetDataframe = datasetDataframe[valid_samples]
             if not datasetDataframe.empty:
-                data = PatientData(dataset_origin, datasetDataframe.loc[datasetDataframe.index, "Patient"].copy())
-                data = self.__fillClinicalData(data, datasetDataframe, forTraining, groupAges)
-    
-                filenames = datasetDataframe[GENOMIC_PROPS[dataset]].unique()
-                paths = [ path.join(directoryFolder, f) for f in filenames]
-                vcfgenescoredict = {}
-                vcfgenesfunctiondict = {}
-                vcfgenestloddict = {}
-                vcfgenesqssdict = {}
-                vcfgenesbigqssdict = {}
-                vcfgenesclustereddict = {}
-                vcfgenesgermlineriskdict = {}
-                vcfgenessomaticriskdict = {}
-                for k, v in zip(filenames, self.__executor.map(reader.readVCFFileFindCompression, paths)):
-                    vcfgenescoredict[k] = v[0]
-                    vcfgenesfunctiondict[k] = v[1]
-                    vcfgenestloddict[k] = v[2]
-                    vcfgenesqssdict[k] = v[3]
-                    vcfgenesbigqssdict[k] = v[4]
-                    vcfgenesclustereddict[k] = v[5]
-                    vcfgenesgermlineriskdict[k] = v[6]
-                    vcfgenessomaticriskdict[k] = v[7]
-                    
-                
-                vcfGenesScoreDF = self.__tranfromVCFDictToVCFDataframe(vcfgenescoredict, datasetDataframe, GENOMIC_PROPS[dataset])
-                vcfGenesScoreDF[vcfGenesScoreDF < 500] = np.nan
-                vcfGenesScoreDF = vcfGenesScoreDF.dropna(axis=1, how='all').fillna(value=0)
-                vcfGenesScoreDF[vcfGenesScoreDF >= 500] = 1
-                #vcfGenesScoreDF = vcfGenesScoreDF.fillna(value=0)
-                data.set_genes_scoring(vcfGenesScoreDF)
-                
-                vcfGenesFunctDF = self.__tranfromVCFDictToVCFDataframe(vcfgenesfunctiondict, datasetDataframe, GENOMIC_PROPS[dataset])
-                vcfGenesFunctDF = vcfGenesFunctDF.fillna(value=0)
-                data.set_genes_function_associated(vcfGenesFunctDF)
-                
-                vcfGenesTLODDF = self.__tranfromVCFDictToVCFDataframe(vcfgenestloddict, datasetDataframe, GENOMIC_PROPS[dataset])
-                vcfGenesTLODDF = vcfGenesTLODDF.fillna(value=0)
-                if not vcfGenesTLODDF.empty:
-                    data.set_genes_tlod(vcfGenesTLODDF)
-                    
-                vcfGenesQSSDF = self.__tranfromVCFDictToVCFDataframe(vcfgenesqssdict, datasetDataframe, GENOMIC_PROPS[dataset])
-                vcfGenesQSSDF = vcfGenesQSSDF.fillna(value=0)
-                if not vcfGenesQSSDF.empty:
-                    data.set_genes_qss(vcfGenesQSSDF)
-                
-                vcfGenesBigQSSDF = self.__tranfromVCFDictToVCFDataframe(vcfgenesbigqssdict, datasetDataframe, GENOMIC_PROPS[dataset])
-                vcfGenesBigQSSDF = vcfGenesBigQSSDF.fillna(value=0)
-                if not vcfGenesBigQSSDF.empty:
-                    data.set_genes_big_qss(vcfGenesBigQSSDF)    
-                
-                data.set_cytogenetic_features(datasetDataframe[CYTOGENETICS_PROPS])
-
-                vcfGenesclusteredDF = self.__tranfromVCFDictToVCFDataframe(vcfgenesclustereddict, datasetDataframe, GENOMIC_PROPS[dataset])
-                vcfGenesclusteredDF = vcfGenesclusteredDF.fillna(value=0)
-                if not vcfGenesclusteredDF.empty:
-                    data.set_genes_clustered(vcfGenesclusteredDF)
-                    
-                vcfGenesGermlineRiskDF = self.__tranfromVCFDictToVCFDataframe(vcfgenesgermlineriskdict, datasetDataframe, GENOMIC_PROPS[dataset])
-                vcfGenesGermlineRiskDF = vcfGenesGermlineRiskDF.fillna(value=0)
-                if not vcfGenesGermlineRiskDF.empty:
-                    data.set_genes_germline_risk(vcfGenesGermlineRiskDF)
-                    
-                vcfGenesSomaticRiskDF = self.__tranfromVCFDictToVCFDataframe(vcfgenessomaticriskdict, datasetDataframe, GENOMIC_PROPS[dataset])
-                vcfGenesSomaticRiskDF = vcfGenesSomaticRiskDF.fillna(value=0)
-                if not vcfGenesSomaticRiskDF.empty:
-                    data.set_genes_somatic_risk(vcfGenesSomaticRiskDF)
-                
-                if not vcfGenesScoreDF.empty:
-                    result[dataset_origin] = data
+                filenames, paths = self.__datasetPaths(directoryFolder, dataset, datasetDataframe)
+                selectedDatasets.append((dataset, dataset_origin, datasetDataframe, filenames, paths))
+        return selectedDatasets
+
+    def __withoutQuarantined(self, directoryFolder, selectedDatasets):
+        '''
+        The selected datasets without the patients of quarantined files.
+        '''
+        if not self.__quarantine:
+            return selectedDatasets
+        healthy = []
+        for dataset, dataset_origin, datasetDataframe, filenames, paths in selectedDatasets:
+            quarantined = [f for f, p in zip(filenames, paths) if p in self.__quarantine]
+            if quarantined:
+                datasetDataframe = datasetDataframe[~datasetDataframe[GENOMIC_PROPS[dataset]].isin(quarantined)]
+                if datasetDataframe.empty:
+                    continue
+                filenames, paths = self.__datasetPaths(directoryFolder, dataset, datasetDataframe)
+            healthy.append((dataset, dataset_origin, datasetDataframe, filenames, paths))
+        return healthy
 
+    def __datasetPaths(self, directoryFolder, dataset, datasetDataframe):
+        filenames = datasetDataframe[GENOMIC_PROPS[dataset]].unique()
+        paths = [ path.join(directoryFolder, f) for f in filenames]
+        return filenames, paths
+
+    def __buildPatientData(self, dataset, dataset_origin, datasetDataframe, filenames, paths, vcfFeaturesByPath,
+                           forTraining, groupAges):
+        data = PatientData(dataset_origin, datasetDataframe.loc[datasetDataframe.index, "Patient"].copy())
+        data = self.__fillClinicalData(data, datasetDataframe, forTraining, groupAges)
+
+        vcfgenescoredict = {}
+        vcfgenesfunctiondict = {}
+        vcfgenestloddict = {}
+        vcfgenesqssdict = {}
+        vcfgenesbigqssdict = {}
+        vcfgenesclustereddict = {}
+        vcfgenesgermlineriskdict = {}
+        vcfgenessomaticriskdict = {}
+        for k, p in zip(filenames, paths):
+            v = vcfFeaturesByPath[p]
+            vcfgenescoredict[k] = v[0]
+            vcfgenesfunctiondict[k] = v[1]
+            vcfgenestloddict[k] = v[2]
+            vcfgenesqssdict[k] = v[3]
+            vcfgenesbigqssdict[k] = v[4]
+            vcfgenesclustereddict[k] = v[5]
+            vcfgenesgermlineriskdict[k] = v[6]
+            vcfgenessomaticriskdict[k] = v[7]
+            
+        
+        vcfGenesScoreDF = self.__tranfromVCFDictToVCFDataframe(vcfgenescoredict, datasetDataframe, GENOMIC_PROPS[dataset])
+        data.set_genes_scoring(vcfGenesScoreDF)
+        
+        vcfGenesFunctDF = self.__tranfromVCFDictToVCFDataframe(vcfgenesfunctiondict, datasetDataframe, GENOMIC_PROPS[dataset])
+        data.set_genes_function_associated(vcfGenesFunctDF)
+        
+        vcfGenesTLODDF = self.__tranfromVCFDictToVCFDataframe(vcfgenestloddict, datasetDataframe, GENOMIC_PROPS[dataset])
+        if not vcfGenesTLODDF.empty:
+            data.set_genes_tlod(vcfGenesTLODDF)
+            
+        vcfGenesQSSDF = self.__tranfromVCFDictToVCFDataframe(vcfgenesqssdict, datasetDataframe, GENOMIC_PROPS[dataset])
+        if not vcfGenesQSSDF.empty:
+            data.set_genes_qss(vcfGenesQSSDF)
+        
+        vcfGenesBigQSSDF = self.__tranfromVCFDictToVCFDataframe(vcfgenesbigqssdict, datasetDataframe, GENOMIC_PROPS[dataset])
+        if not vcfGenesBigQSSDF.empty:
+            data.set_genes_big_qss(vcfGenesBigQSSDF)    
+        
+        data.set_cytogenetic_features(datasetDataframe[CYTOGENETICS_PROPS])
+
+        vcfGenesclusteredDF = self.__tranfromVCFDictToVCFDataframe(vcfgenesclustereddict, datasetDataframe, GENOMIC_PROPS[dataset])
+        if not vcfGenesclusteredDF.empty:
+            data.set_genes_clustered(vcfGenesclusteredDF)
+            
+        vcfGenesGermlineRiskDF = self.__tranfromVCFDictToVCFDataframe(vcfgenesgermlineriskdict, datasetDataframe, GENOMIC_PROPS[dataset])
+        if not vcfGenesGermlineRiskDF.empty:
+            data.set_genes_germline_risk(vcfGenesGermlineRiskDF)
+            
+        vcfGenesSomaticRiskDF = self.__tranfromVCFDictToVCFDataframe(vcfgenessomaticriskdict, datasetDataframe, GENOMIC_PROPS[dataset])
+        if not vcfGenesSomaticRiskDF.empty:
+            data.set_genes_somatic_risk(vcfGenesSomaticRiskDF)
+        return data
+
+    def __appendPatientData(self, data, newData):
+        '''
+        PatientData with the patients of newData appended to those of data.
+        '''
+        result = PatientData(data.get_dataset_origin(), pd.concat([data.get_patients(), newData.get_patients()]))
+        for name in ["ages", "ageRisk", "ISSs", "flags", "cytogenetic_features"]:
+            parts = [part for part in [getattr(data, "get_" + name)(), getattr(newData, "get_" + name)()]
+                     if part is not None]
+            if parts:
+                getattr(result, "set_" + name)(pd.concat(parts))
+        index = pd.Index(data.get_patients().values, name="Patient")
+        newIndex = pd.Index(newData.get_patients().values, name="Patient")
+        for name in VCF_FEATURE_GROUPS:
+            group = getattr(data, "get_" + name)()
+            newGroup = getattr(newData, "get_" + name)()
+            if group is None and newGroup is None:
+                continue
+            group = appendBinaryRows(group if group is not None else pd.DataFrame(index=index),
+                                     newGroup if newGroup is not None else pd.DataFrame(index=newIndex))
+            if not group.empty or name in ("genes_scoring", "genes_function_associated"):
+                getattr(result, "set_" + name)(group)
         return result
-     
+
+    def __readVCFFiles(self, cache, paths):
+        '''
+        Reads the feature groups of every distinct path into a dict by path,
+        taking them from the cache when possible. Files missing from the cache
+        are parsed by a worker pool, largest first so no big file is left
+        running alone at the end, whose workers cache their results. Files
+        that fail are quarantined instead of failing the run.
+        '''
+        results = {}
+        self.__quarantine = {}
+        paths = list(OrderedDict.fromkeys(paths))
+        if cache is not None:
+            for p in paths:
+                v = cache.get(p)
+                if v is not None:
+                    results[p] = v
+            print("VCF files found in cache: " + str(len(results)) + "/" + str(len(paths)))
+        missing = [p for p in paths if p not in results]
+        if missing:
+            missing.sort(key=self.__fileSize, reverse=True)
+            with VCFWorkerPool(self.__processes, self.__maxtasksperchild, panel=self.__panel,
+                               cache=cache, timeout=self.__fileTimeout, scratch=self.__scratchTransfer) as executor:
+                for p, v, error in executor.readVCFFiles(missing):
+                    if error is not None:
+                        self.__quarantine[p] = error
+                        continue
+                    results[p] = v
+            self.__reportQuarantine(cache, missing)
+        return results
+
+    def __reportQuarantine(self, cache, paths):
+        if self.__quarantine:
+            print("VCF files quarantined: " + str(len(self.__quarantine)) + "/" + str(len(paths)))
+            for p, error in sorted(self.__quarantine.items()):
+                print("    " + p + ": " + error)
+        if cache is None:
+            return
+        # the report covers every run sharing the cache folder
+        reportFile = path.join(cache.getCacheFolder(), QUARANTINE_FILE)
+        try:
+            report = {}
+            if path.exists(reportFile):
+                with open(reportFile) as f:
+                    report = json.load(f)
+            for p in paths:
+                report.pop(path.abspath(p), None)
+            for p, error in self.__quarantine.items():
+                report[path.abspath(p)] = error
+            if report or path.exists(reportFile):
+                os.makedirs(cache.getCacheFolder(), exist_ok=True)
+                with open(reportFile, "w") as f:
+                    json.dump(report, f, indent=2, sort_keys=True)
+        except (OSError, ValueError) as e:
+            print("Could not update the quarantine report " + reportFile + ": " + str(e))
+
+    def __fileSize(self, filename):
+        try:
+            return os.path.getsize(filename)
+        except OSError:
+            return 0
+
     def __fillClinicalData(self, patientdata, datasetDataframe, forTraining=False, groupAges=False):
         colums = self.__clinicalData.columns
         containsAge = "D_Age" in colums
@@ -153,15 +349,12 @@ class VCFDataPreprocessor(object):
         return patientdata
                
     def __tranfromVCFDictToVCFDataframe(self, vcfDict, datasetDataframe, datasetcolumn):
-        vcfDataframe = pd.DataFrame(vcfDict)
-        vcfDataframe = vcfDataframe.T
-        vcfDataframe.fillna(value=0, inplace=True)
-        datasetDataframe = datasetDataframe.loc[datasetDataframe.index, ["Patient", datasetcolumn]]
-        patientbyfilename = datasetDataframe.set_index(datasetcolumn, drop=True, append=False, inplace=False)
-        patientbyfilename = patientbyfilename.join(vcfDataframe)
-        patientbyfilename = patientbyfilename.loc[pd.notnull(patientbyfilename.index)]
-        vcfDataframe = patientbyfilename.set_index("Patient", drop=True, append=False, inplace=False)
-        return vcfDataframe
+        datasetDataframe = datasetDataframe.loc[pd.notnull(datasetDataframe[datasetcolumn]), ["Patient", datasetcolumn]]
+        noFeatures = {}
+        matrix, columns = buildSparseFeatureMatrix(
+            [vcfDict.get(filename, noFeatures) for filename in datasetDataframe[datasetcolumn]], dtype=np.uint8)
+        patients = pd.Index(datasetDataframe["Patient"].values, name="Patient")
+        return sparseMatrixToDataframe(matrix, patients, columns)
         
     def __ageToGroup(self, age):
         if age is np.nan:
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+def buildSparseFeatureMatrix(rowDicts, dtype=np.float64):
+    '''
+    Builds a CSR patient by feature matrix from one {feature: value} dict per
+    row, over the vocabulary of features found in the rows (in order of first
+    appearance). Rows may share the same dict, which is then only indexed
+    once. Returns the matrix and its list of column names.
+    '''
+    vocabulary = {}
+    encodedDicts = {}
+    indptr = [0]
+    indices = []
+    data = []
+    for rowDict in rowDicts:
+        encoded = encodedDicts.get(id(rowDict))
+        if encoded is None:
+            columns = []
+            values = []
+            for feature, value in rowDict.items():
+                column = vocabulary.get(feature)
+                if column is None:
+                    column = vocabulary[feature] = len(vocabulary)
+                columns.append(column)
+                values.append(value)
+            encoded = encodedDicts[id(rowDict)] = (columns, values)
+        indices.extend(encoded[0])
+        data.extend(encoded[1])
+        indptr.append(len(indices))
+    matrix = sp.csr_matrix((np.array(data, dtype=dtype), np.array(indices, dtype=np.int64),
+                            np.array(indptr, dtype=np.int64)), shape=(len(indptr) - 1, len(vocabulary)))
+    matrix.sum_duplicates()
+    columns = [None] * len(vocabulary)
+    for feature, column in vocabulary.items():
+        columns[column] = feature
+    return matrix, columns
+
+
+def sparseMatrixToDataframe(matrix, index, columns):
+    '''
+    Wraps a sparse matrix in a dataframe of sparse columns (fill value 0).
+    '''
+    dataframe = pd.DataFrame.sparse.from_spmatrix(matrix, index=index, columns=columns)
+    # recent pandas versions fill float matrices with NaN instead of 0
+    return dataframe.astype(pd.SparseDtype(matrix.dtype, 0))
+
+
+def dataframeToSparseMatrix(dataframe):
+    '''
+    CSR matrix with the values of dataframe, missing values read as 0.
+    '''
+    if len(dataframe.columns) and all(isinstance(dtype, pd.SparseDtype) for dtype in dataframe.dtypes):
+        matrix = dataframe.sparse.to_coo().tocsr()
+        if matrix.dtype.kind == 'f':
+            matrix.data[np.isnan(matrix.data)] = 0
+        matrix.eliminate_zeros()
+        return matrix
+    values = dataframe.values
+    missing = pd.isnull(values)
+    if missing.any():
+        values = np.where(missing, 0, values)
+    return sp.csr_matrix(values.astype(np.float64) if values.dtype == object else values)
+
+
+def concatBinaryColumns(dataframes):
+    '''
+    Concatenates 0/1 dataframes side by side over the union of their indexes,
+    like pd.concat(axis=1), but without going through float: rows missing from
+    a dataframe are read as 0 and the result keeps uint8 sparse columns.
+    '''
+    dataframes = [dataframe for dataframe in dataframes if dataframe is not None]
+    index = dataframes[0].index
+    for dataframe in dataframes[1:]:
+        if not index.equals(dataframe.index):
+            index = index.union(dataframe.index, sort=False)
+    blocks = []
+    columns = []
+    for dataframe in dataframes:
+        matrix = (dataframeToSparseMatrix(dataframe) != 0).astype(np.uint8)
+        rows = index.get_indexer(dataframe.index)
+        placement = sp.csr_matrix((np.ones(len(rows), dtype=np.uint8), (rows, np.arange(len(rows)))),
+                                  shape=(len(index), len(rows)))
+        blocks.append(placement.dot(matrix))
+        columns.extend(dataframe.columns)
+    matrix = sp.hstack(blocks, format='csr', dtype=np.uint8)
+    return sparseMatrixToDataframe(matrix, index, pd.Index(columns))
+
+
+def mergeBinaryColumns(dataframe):
+    '''
+    Merges columns sharing the same name into a single 0/1 column, set where
+    any of them is nonzero, and drops the columns that are 0 for every row.
+    The merged columns are sorted by name.
+    '''
+    codes, names = pd.factorize(dataframe.columns, sort=True)
+    matrix = dataframeToSparseMatrix(dataframe)
+    grouping = sp.csr_matrix((np.ones(len(codes), dtype=np.int32), (np.arange(len(codes)), codes)),
+                             shape=(len(codes), len(names)))
+    matrix = (matrix != 0).astype(np.int32).dot(grouping).tocsr()
+    matrix = sp.csr_matrix((np.ones(matrix.nnz, dtype=np.uint8), matrix.indices, matrix.indptr), shape=matrix.shape)
+    present = np.flatnonzero(matrix.getnnz(axis=0))
+    return sparseMatrixToDataframe(matrix[:, present], dataframe.index, names[present])
+
+
+def appendBinaryRows(dataframe, newDataframe):
+    '''
+    Appends the rows of newDataframe below those of dataframe, both 0/1, over
+    the columns of dataframe followed by the columns only newDataframe has.
+    The existing rows are only padded with empty columns, never densified nor
+    realigned.
+    '''
+    matrix = _binaryMatrix(dataframe)
+    newMatrix = _binaryMatrix(newDataframe)
+    columns = dataframe.columns.append(newDataframe.columns.difference(dataframe.columns, sort=False))
+    matrix.resize((matrix.shape[0], len(columns)))
+    placement = columns.get_indexer(newDataframe.columns)
+    newMatrix = sp.csr_matrix((newMatrix.data, placement[newMatrix.indices], newMatrix.indptr),
+                              shape=(newMatrix.shape[0], len(columns)))
+    newMatrix.sort_indices()
+    matrix = sp.vstack([matrix, newMatrix], format='csr', dtype=np.uint8)
+    return sparseMatrixToDataframe(matrix, dataframe.index.append(newDataframe.index), columns)
+
+
+def _binaryMatrix(dataframe):
+    if not len(dataframe.columns):
+        return sp.csr_matrix((len(dataframe.index), 0), dtype=np.uint8)
+    return (dataframeToSparseMatrix(dataframe) != 0).astype(np.uint8).tocsr()
@@ -1,7 +1,9 @@
+import os
 import pickle
 
 from datastructures.patientdata import PatientData
 import os.path as path
+from readers.vcfreader import FILTERING_FILE
 
 
 serialized_Features_folder = 'serialized_features'
@@ -15,6 +17,48 @@ model_synonyms = {
     "StrelkasnvsRnaseq_filtered" : "Strelkasnvs_filtered"
 }
 
+# prefixes of the gene name in the columns of the per gene feature groups
+gene_feature_prefixes = {
+    "genesTlod" : "TLOD_",
+    "genesQss" : "QSS_",
+    "genesBigQss" : "BIGQSS_",
+    "genesClustered" : "Clustered_",
+    "genesGermlineRisk" : "Germline_",
+    "genesSomaticRisk" : "Somatic_"
+}
+
+def loadGenePanel(folder=serialized_Features_folder):
+    '''
+    Gene symbols named by the columns the VCF feature groups of some model
+    keep, across the serialized feature lists in folder. Reading the VCF
+    files restricted to this panel yields the VCF features the models are
+    given. Columns of variants without a gene name (such as "Germline_")
+    put the empty name in the panel. A genesFunctionAssociated column names
+    a gene followed by a function, so every gene it may name is taken.
+    '''
+    with open(FILTERING_FILE, 'rb') as f:
+        functions = pickle.load(f)["functions"]
+    suffixes = ["_" + function for function in functions]
+    panel = set()
+    for filename in os.listdir(folder):
+        if "_featColumns_" not in filename:
+            continue
+        group = filename[:filename.index("_featColumns_")].rsplit("_", 1)[-1]
+        if group != "genesScoring" and group != "genesFunctionAssociated" and group not in gene_feature_prefixes:
+            continue
+        with open(path.join(folder, filename), 'rb') as f:
+            features = pickle.load(f)
+        for feature in features:
+            if group == "genesScoring":
+                panel.add(feature)
+            elif group == "genesFunctionAssociated":
+                for suffix in suffixes:
+                    if feature.endswith(suffix):
+                        panel.add(feature[:-len(suffix)])
+            elif feature.startswith(gene_feature_prefixes[group]):
+                panel.add(feature[len(gene_feature_prefixes[group]):])
+    return frozenset(panel)
+
 class VCFFeaturesSelector(object):
     
     def __init__(self, data):
@@ -103,7 +147,7 @@ class VCFFeaturesSelector(object):
         if dataframe is not None:
             features = self.__loadSerializedFeatures('genesScoring')
             self.__get_Column_Counts(features, dataframe, 'genesScoring', data.get_dataset_origin())
-            filteredDataframe = dataframe.loc[:, features]
+            filteredDataframe = dataframe.reindex(columns=features)
             return filteredDataframe
         return None
     
@@ -112,7 +156,7 @@ class VCFFeaturesSelector(object):
         if dataframe is not None:
             features = self.__loadSerializedFeatures('genesFunctionAssociated')
             self.__get_Column_Counts(features, dataframe, 'genesFunctionAssociated', data.get_dataset_origin())
-            filteredDataframe = dataframe.loc[:, features]
+            filteredDataframe = dataframe.reindex(columns=features)
             return filteredDataframe
         return None
     
@@ -121,7 +165,7 @@ class VCFFeaturesSelector(object):
         if dataframe is not None:
             features = self.__loadSerializedFeatures('cytogeneticFeatures')
             self.__get_Column_Counts(features, dataframe, 'cytogeneticFeatures', data.get_dataset_origin())
-            filteredDataframe = dataframe.loc[:, features]
+            filteredDataframe = dataframe.reindex(columns=features)
             return filteredDataframe
         return None
     
@@ -130,7 +174,7 @@ class VCFFeaturesSelector(object):
         if dataframe is not None:
             features = self.__loadSerializedFeatures('genesTlod')
             self.__get_Column_Counts(features, dataframe, 'genesTlod', data.get_dataset_origin())
-            filteredDataframe = dataframe.loc[:, features]
+            filteredDataframe = dataframe.reindex(columns=features)
             return filteredDataframe
         return None
     
@@ -139,7 +183,7 @@ class VCFFeaturesSelector(object):
         if dataframe is not None:
             features = self.__loadSerializedFeatures('genesQss')
             self.__get_Column_Counts(features, dataframe, 'genesQss', data.get_dataset_origin())
-            filteredDataframe = dataframe.loc[:, features]
+            filteredDataframe = dataframe.reindex(columns=features)
             return filteredDataframe
         return None
     
@@ -148,7 +192,7 @@ class VCFFeaturesSelector(object):
         if dataframe is not None:
             features = self.__loadSerializedFeatures('genesBigQss')
             self.__get_Column_Counts(features, dataframe, 'genesBigQss', data.get_dataset_origin())
-            filteredDataframe = dataframe.loc[:, features]
+            filteredDataframe = dataframe.reindex(columns=features)
             return filteredDataframe
         return None
     
@@ -157,7 +201,7 @@ class VCFFeaturesSelector(object):
         if dataframe is not None:
             features = self.__loadSerializedFeatures('genesClustered')
             self.__get_Column_Counts(features, dataframe, 'genesClustered', data.get_dataset_origin())
-            filteredDataframe = dataframe.loc[:, features]
+            filteredDataframe = dataframe.reindex(columns=features)
             return filteredDataframe
         return None
     
@@ -166,7 +210,7 @@ class VCFFeaturesSelector(object):
         if dataframe is not None:
             features = self.__loadSerializedFeatures('genesGermlineRisk')
             self.__get_Column_Counts(features, dataframe, 'genesGermlineRisk', data.get_dataset_origin())
-            filteredDataframe = dataframe.loc[:, features]
+            filteredDataframe = dataframe.reindex(columns=features)
             return filteredDataframe
         return None
     
@@ -175,7 +219,7 @@ class VCFFeaturesSelector(object):
         if dataframe is not None:
             features = self.__loadSerializedFeatures('genesSomaticRisk')
             self.__get_Column_Counts(features, dataframe, 'genesSomaticRisk', data.get_dataset_origin())
-            filteredDataframe = dataframe.loc[:, features]
+            filteredDataframe = dataframe.reindex(columns=features)
             return filteredDataframe
         return None
         
\ No newline at end of file
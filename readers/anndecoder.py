@@ -0,0 +1,143 @@
+from array import array
+
+import numpy as np
+
+
+class ANNDecoder(object):
+    '''
+    Decodes the SnpEff ANN entries of a record (Allele | Annotation |
+    Annotation_Impact | Gene_Name | ...) into parallel lists of integer codes
+    for the gene name, the effect and the impact of every entry. Names are
+    interned once per decoder, so codes are shared by every record and file
+    it decodes and collectors can aggregate on codes instead of strings.
+    '''
+
+    def __init__(self):
+        self.__geneCodes = {}
+        self.__effectCodes = {}
+        self.__impactCodes = {}
+        self.genes = []
+        self.effects = []
+        self.impacts = []
+
+    def geneCode(self, gene):
+        code = self.__geneCodes.get(gene)
+        if code is None:
+            code = self.__geneCodes[gene] = len(self.genes)
+            self.genes.append(gene)
+        return code
+
+    def effectCode(self, effect):
+        code = self.__effectCodes.get(effect)
+        if code is None:
+            code = self.__effectCodes[effect] = len(self.effects)
+            self.effects.append(effect)
+        return code
+
+    def impactCode(self, impact):
+        code = self.__impactCodes.get(impact)
+        if code is None:
+            code = self.__impactCodes[impact] = len(self.impacts)
+            self.impacts.append(impact)
+        return code
+
+    def panelMask(self, panel):
+        '''
+        Function of a gene code telling whether the gene is in panel, caching
+        the answer of every code.
+        '''
+        mask = []
+
+        def inPanel(code):
+            while len(mask) <= code:
+                mask.append(self.genes[len(mask)] in panel)
+            return mask[code]
+        return inPanel
+
+    def decode(self, entries):
+        geneCodes = self.__geneCodes
+        effectCodes = self.__effectCodes
+        impactCodes = self.__impactCodes
+        genes = []
+        effects = []
+        impacts = []
+        for entry in entries:
+            # the fields after the gene name are never used
+            fields = entry.split('|', 4)
+            code = effectCodes.get(fields[1])
+            effects.append(self.effectCode(fields[1]) if code is None else code)
+            code = impactCodes.get(fields[2])
+            impacts.append(self.impactCode(fields[2]) if code is None else code)
+            code = geneCodes.get(fields[3])
+            genes.append(self.geneCode(fields[3]) if code is None else code)
+        return DecodedAnnotations(self, genes, effects, impacts)
+
+
+class DecodedAnnotations(object):
+    '''
+    Gene, effect and impact codes of the ANN entries of one record, in the
+    order of the entries, along with the decoder mapping them to names.
+    '''
+
+    __slots__ = ('decoder', 'genes', 'effects', 'impacts')
+
+    def __init__(self, decoder, genes, effects, impacts):
+        self.decoder = decoder
+        self.genes = genes
+        self.effects = effects
+        self.impacts = impacts
+
+    def __len__(self):
+        return len(self.genes)
+
+    def select(self, keep):
+        '''
+        The entries whose gene code keep returns True for.
+        '''
+        indexes = [i for i, gene in enumerate(self.genes) if keep(gene)]
+        if len(indexes) == len(self.genes):
+            return self
+        return DecodedAnnotations(self.decoder, [self.genes[i] for i in indexes],
+                                  [self.effects[i] for i in indexes], [self.impacts[i] for i in indexes])
+
+
+class ImpactScoreAccumulator(object):
+    '''
+    Sums an impact weight per gene over the (gene code, impact code) pairs
+    it is given, in one bincount when the totals are asked for, instead of
+    updating a score per pair.
+    '''
+
+    def __init__(self, decoder, weights):
+        self.__decoder = decoder
+        self.__weights = weights
+        self.__genes = array('q')
+        self.__impacts = array('q')
+
+    def add(self, gene, impact):
+        self.__genes.append(gene)
+        self.__impacts.append(impact)
+
+    def totals(self):
+        '''
+        Gene codes in order of first appearance and their total weights.
+        '''
+        if not self.__genes:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        genes = np.frombuffer(self.__genes, dtype=np.int64)
+        impacts = np.frombuffer(self.__impacts, dtype=np.int64)
+        weights = np.zeros(len(self.__decoder.impacts), dtype=np.int64)
+        for impact in np.unique(impacts):
+            weights[impact] = self.__weights[self.__decoder.impacts[impact]]
+        totals = np.bincount(genes, weights=weights[impacts])
+        codes, first = np.unique(genes, return_index=True)
+        codes = codes[np.argsort(first, kind='stable')]
+        return codes, totals[codes].astype(np.int64)
+
+    def genesAtOrAbove(self, threshold):
+        '''
+        Gene codes whose total weight is at least threshold, in order of
+        first appearance.
+        '''
+        codes, totals = self.totals()
+        return codes[totals >= threshold]
@@ -0,0 +1,242 @@
+""" Decompression backends feeding raw lines to ``parser.Reader``.
+
+BGZF (bgzip) files are a series of gzip members of at most 64 KiB each,
+every one carrying its compressed size in a ``BC`` extra subfield, so they
+can be cut into blocks without inflating them and the blocks inflated on a
+thread pool (zlib releases the GIL).  Plain gzip files can not be split and
+are inflated as a stream.  Either way the inflated bytes go straight to the
+byte level line splitter, without the ``GzipFile`` and ``codecs`` text
+layers, and the reader only decodes what it needs.
+"""
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+_GZIP_MAGIC = b'\x1f\x8b\x08'
+_FEXTRA = 4
+_HEADER = struct.Struct('<4BI2BH')
+_BLOCK_MAX = 0xff00
+_EOF_BLOCK = (b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43'
+              b'\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00')
+
+#: bytes read at once from plain gzip streams
+STREAM_CHUNK = 1 << 20
+#: BGZF blocks inflated by one thread pool task
+BLOCKS_PER_TASK = 16
+
+
+def default_threads():
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def is_bgzf(header):
+    """ Whether ``header`` (the first 18 bytes of a file) opens a BGZF block """
+    return (len(header) >= 18 and header[:3] == _GZIP_MAGIC and header[3] & _FEXTRA
+            and header[12:14] == b'BC')
+
+
+def _read_block(fsock):
+    """ Reads one raw BGZF block, or returns None at the end of the file """
+    header = fsock.read(12)
+    if not header:
+        return None
+    if len(header) < 12 or header[:3] != _GZIP_MAGIC or not header[3] & _FEXTRA:
+        raise ValueError('Not a BGZF block')
+    xlen = _HEADER.unpack(header)[-1]
+    extra = fsock.read(xlen)
+    bsize = None
+    pos = 0
+    while pos + 4 <= len(extra):
+        slen = struct.unpack('<H', extra[pos + 2:pos + 4])[0]
+        if extra[pos:pos + 2] == b'BC' and slen == 2:
+            bsize = struct.unpack('<H', extra[pos + 4:pos + 6])[0]
+        pos += 4 + slen
+    if bsize is None:
+        raise ValueError('BGZF block without a BC subfield')
+    rest = fsock.read(bsize - xlen - 11)
+    if len(rest) != bsize - xlen - 11:
+        raise ValueError('Truncated BGZF block')
+    return rest
+
+
+def _iter_blocks(fsock):
+    """ Raw BGZF blocks of fsock from its current position.  Raises
+        EOFError if the last one is not the end-of-file marker block, as
+        then the file was cut short, possibly right at a block boundary.
+    """
+    block = None
+    while True:
+        last, block = block, _read_block(fsock)
+        if block is None:
+            break
+        yield block
+    if last is not None and last != _EOF_BLOCK[18:]:
+        raise EOFError('BGZF file ended before the end-of-file marker block')
+
+
+def iter_inflated_blocks(fsock):
+    """ Yields (file offset, inflated data) for every BGZF block of fsock
+        from its current position, one block at a time.
+    """
+    offset = fsock.tell()
+    for block in _iter_blocks(fsock):
+        yield offset, _inflate_blocks([block])
+        offset = fsock.tell()
+
+
+def _inflate_blocks(blocks):
+    out = []
+    for block in blocks:
+        data = zlib.decompress(block[:-8], -15)
+        crc, isize = struct.unpack('<II', block[-8:])
+        if isize != len(data) or crc != zlib.crc32(data) & 0xffffffff:
+            raise ValueError('Corrupt BGZF block')
+        out.append(data)
+    return b''.join(out)
+
+
+def _bgzf_tasks(fsock):
+    blocks = []
+    for block in _iter_blocks(fsock):
+        blocks.append(block)
+        if len(blocks) == BLOCKS_PER_TASK:
+            yield blocks
+            blocks = []
+    if blocks:
+        yield blocks
+
+
+def iter_bgzf_chunks(fsock, threads=None):
+    """ Yields the inflated contents of a BGZF file in order, a few blocks
+        at a time, keeping at most two tasks per thread in flight.
+    """
+    threads = threads or default_threads()
+    tasks = _bgzf_tasks(fsock)
+    if threads == 1:
+        for blocks in tasks:
+            yield _inflate_blocks(blocks)
+        return
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        pending = []
+        for blocks in tasks:
+            pending.append(executor.submit(_inflate_blocks, blocks))
+            if len(pending) >= 2 * threads:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def iter_gzip_chunks(fsock, head=b''):
+    """ Yields the inflated contents of a (possibly multi member) gzip
+        stream, ``head`` being bytes already read from its start.
+    """
+    inflater = zlib.decompressobj(31)
+    data = head or fsock.read(STREAM_CHUNK)
+    started = bool(data)
+    while data:
+        chunk = inflater.decompress(data)
+        if chunk:
+            yield chunk
+        while inflater.eof and inflater.unused_data:
+            data = inflater.unused_data
+            inflater = zlib.decompressobj(31)
+            chunk = inflater.decompress(data)
+            if chunk:
+                yield chunk
+        data = fsock.read(STREAM_CHUNK)
+    chunk = inflater.flush()
+    if chunk:
+        yield chunk
+    if started and not inflater.eof:
+        raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+
+
+def iter_chunks_from(fsock, virtual_offset, threads=None):
+    """ Inflated byte chunks of a BGZF file from a virtual offset: the file
+        offset of a block shifted left by 16 bits, plus an offset within
+        the inflated block.
+    """
+    fsock.seek(virtual_offset >> 16)
+    skip = virtual_offset & 0xffff
+    for chunk in iter_bgzf_chunks(fsock, threads):
+        if skip:
+            chunk = chunk[skip:]
+            skip = 0
+        yield chunk
+
+
+def iter_chunks(fsock, threads=None):
+    """ Inflated byte chunks of a gzipped binary stream, BGZF or not """
+    head = fsock.read(18)
+    if is_bgzf(head):
+        return iter_bgzf_chunks(_Prepended(head, fsock), threads)
+    return iter_gzip_chunks(fsock, head)
+
+
+def iter_file_chunks(fsock):
+    """ Byte chunks of an uncompressed binary stream """
+    while True:
+        data = fsock.read(STREAM_CHUNK)
+        if not data:
+            return
+        yield data
+
+
+def iter_byte_lines(chunks):
+    """ Splits byte chunks into lines, without the ``\n`` terminators """
+    rest = b''
+    for chunk in chunks:
+        lines = (rest + chunk).split(b'\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line
+    if rest:
+        yield rest
+
+
+class _Prepended(object):
+    """ Binary stream with some bytes already read from it put back """
+
+    def __init__(self, head, fsock):
+        self._head = head
+        self._fsock = fsock
+
+    def read(self, size):
+        if not self._head:
+            return self._fsock.read(size)
+        data, self._head = self._head[:size], self._head[size:]
+        if len(data) < size:
+            data += self._fsock.read(size - len(data))
+        return data
+
+
+class BgzfWriter(object):
+    """ Writes bytes to a binary stream as BGZF blocks, readable by tabix
+        and ``iter_bgzf_chunks``.
+    """
+
+    def __init__(self, fsock, level=6):
+        self._fsock = fsock
+        self._level = level
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= _BLOCK_MAX:
+            self._write_block(bytes(self._buffer[:_BLOCK_MAX]))
+            del self._buffer[:_BLOCK_MAX]
+
+    def _write_block(self, data):
+        compressor = zlib.compressobj(self._level, zlib.DEFLATED, -15)
+        cdata = compressor.compress(data) + compressor.flush()
+        self._fsock.write(_HEADER.pack(0x1f, 0x8b, 8, _FEXTRA, 0, 0, 0xff, 6)
+                          + b'BC' + struct.pack('<HH', 2, len(cdata) + 25) + cdata
+                          + struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data)))
+
+    def close(self):
+        if self._buffer:
+            self._write_block(bytes(self._buffer))
+            self._buffer = bytearray()
+        self._fsock.write(_EOF_BLOCK)
+        self._fsock.close()
@@ -1,7 +1,5 @@
-import codecs
 import collections
-import csv
-import gzip
+import io
 import itertools
 import os
 import re
@@ -12,6 +10,11 @@ try:
 except ImportError:
     from ordereddict import OrderedDict
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 try:
     import pysam
 except ImportError:
@@ -22,8 +25,14 @@ try:
 except ImportError:
     cparse = None
 
-from .model import _Call, _Record, make_calldata_tuple
-from .model import _Substitution, _Breakend, _SingleBreakend, _SV
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from readers import bgzf, vcfindex
+from vcf.model import _Call, _Record, make_calldata_tuple
+from vcf.model import _Substitution, _Breakend, _SingleBreakend, _SV
 
 
 # Metadata parsers/constants
@@ -75,6 +84,168 @@ _Alt = collections.namedtuple('Alt', ['id', 'desc'])
 _Format = collections.namedtuple('Format', ['id', 'num', 'type', 'desc'])
 _SampleInfo = collections.namedtuple('SampleInfo', ['samples', 'gt_bases', 'gt_types', 'gt_phases'])
 _Contig = collections.namedtuple('Contig', ['id', 'length'])
+_Batch = collections.namedtuple('Batch', ['CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO'])
+
+
+class _InfoView(Mapping):
+    '''Read only INFO mapping of a ``_LiteRecord``: the raw INFO column is
+    only split into entries on first use, and every entry is converted the
+    first time its key is looked up.'''
+
+    __slots__ = ('_reader', '_raw', '_entries', '_values')
+
+    def __init__(self, reader, raw):
+        self._reader = reader
+        self._raw = raw
+        self._entries = None
+        self._values = {}
+
+    def _index(self):
+        if self._entries is None:
+            entries = {}
+            if self._raw != '.':
+                fields = self._reader._info_fields
+                for entry in self._raw.split(';'):
+                    ID = entry.split('=', 1)[0]
+                    if fields is None or ID in fields:
+                        entries[ID] = entry
+            self._entries = entries
+        return self._entries
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        entry = self._index()[key]
+        value = self._values[key] = self._reader._parse_info(entry)[key]
+        return value
+
+    def __contains__(self, key):
+        return key in self._index()
+
+    def __iter__(self):
+        return iter(self._index())
+
+    def __len__(self):
+        return len(self._index())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class _LiteRecord(object):
+    '''Record returned by a ``lite_records=True`` reader: the fixed columns
+    in slots, ALT kept as the raw strings until ``ALT`` is read and INFO as
+    an ``_InfoView``.  Samples are always left raw, in ``raw_samples``
+    (see ``Reader.decode_samples``).'''
+
+    __slots__ = ('CHROM', 'POS', 'ID', 'REF', 'QUAL', 'FILTER', 'FORMAT',
+                 'raw_alt', 'raw_samples', 'raw_line', 'samples', '_alt',
+                 '_info', '_reader', '_sample_indexes')
+
+    def __init__(self, reader, chrom, pos, ID, ref, raw_alt, qual, filt,
+                 raw_info, fmt, raw_samples):
+        self.CHROM = chrom
+        self.POS = pos
+        self.ID = ID
+        self.REF = ref
+        self.QUAL = qual
+        self.FILTER = filt
+        self.FORMAT = fmt
+        self.raw_alt = raw_alt
+        self.raw_samples = raw_samples
+        self.raw_line = None
+        self.samples = []
+        self._alt = None
+        self._info = _InfoView(reader, raw_info)
+        self._reader = reader
+        self._sample_indexes = reader._sample_indexes
+
+    @property
+    def ALT(self):
+        if self._alt is None:
+            self._alt = self._reader._map(self._reader._parse_alt, self.raw_alt.split(','))
+        return self._alt
+
+    @property
+    def INFO(self):
+        return self._info
+
+    @property
+    def start(self):
+        return self.POS - 1
+
+    @property
+    def end(self):
+        return self.start + len(self.REF)
+
+    def __repr__(self):
+        return 'Record(CHROM=%s, POS=%s, REF=%s, ALT=%s)' % (self.CHROM, self.POS, self.REF, self.raw_alt)
+
+
+class _TrackedList(list):
+    '''list of a record read with ``raw_lines=True``, clearing the
+    ``raw_line`` of the record when it is changed.'''
+
+    __slots__ = ('_record',)
+
+    def __init__(self, record, values):
+        list.__init__(self, values)
+        self._record = record
+
+
+class _TrackedDict(dict):
+    '''INFO dict of a record read with ``raw_lines=True``, clearing the
+    ``raw_line`` of the record when it is changed.'''
+
+    __slots__ = ('_record',)
+
+    def __init__(self, record, values):
+        dict.__init__(self, values)
+        self._record = record
+
+
+def _clearing_raw_line(method):
+    def change(self, *args, **kwargs):
+        self._record.raw_line = None
+        return method(self, *args, **kwargs)
+    change.__name__ = method.__name__
+    return change
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'append', 'extend',
+              'insert', 'pop', 'remove', 'clear', 'sort', 'reverse'):
+    setattr(_TrackedList, _name, _clearing_raw_line(getattr(list, _name)))
+for _name in ('__setitem__', '__delitem__', '__ior__', 'clear', 'pop', 'popitem',
+              'setdefault', 'update'):
+    setattr(_TrackedDict, _name, _clearing_raw_line(getattr(dict, _name)))
+
+
+def _tracked_setattr(self, name, value):
+    object.__setattr__(self, name, value)
+    if name != 'raw_line' and name[0] != '_':
+        object.__setattr__(self, 'raw_line', None)
+
+
+class _TrackedRecord(_Record):
+    '''``_Record`` of a ``raw_lines=True`` reader: setting any of its
+    attributes clears its ``raw_line``.'''
+
+    __setattr__ = _tracked_setattr
+
+
+class _TrackedLiteRecord(_LiteRecord):
+    '''``_LiteRecord`` of a ``raw_lines=True`` reader: setting any of its
+    attributes clears its ``raw_line``.'''
+
+    __slots__ = ()
+    __setattr__ = _tracked_setattr
+
+    @property
+    def ALT(self):
+        if self._alt is None:
+            self._alt = _TrackedList(self, _LiteRecord.ALT.fget(self))
+        return self._alt
 
 
 class _vcf_metadata_parser(object):
@@ -231,11 +402,51 @@ class _vcf_metadata_parser(object):
         return match.group('key'), match.group('val')
 
 
+def _stripped_lines(lines):
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def _decoded_lines(byte_lines, encoding):
+    for line in byte_lines:
+        line = line.strip()
+        if line:
+            yield line.decode(encoding)
+
+
+def _filtered_lines(lines, split, keep):
+    """ The lines whose FILTER column ``keep`` accepts, taken from the raw
+        line before any other column is parsed.  Header and blank lines are
+        passed through.  ``keep`` is called once per distinct FILTER value.
+    """
+    verdicts = {}
+    for line in lines:
+        if not line or line[:1] in ('#', b'#'):
+            yield line
+            continue
+        row = split(line, 7)
+        if len(row) < 8:
+            # not a record line, left to the parser to complain about
+            yield line
+            continue
+        value = row[6]
+        verdict = verdicts.get(value)
+        if verdict is None:
+            verdict = verdicts[value] = keep(value)
+        if verdict:
+            yield line
+
+
 class Reader(object):
     """ Reader for a VCF v 4.0 file, an iterator returning ``_Record objects`` """
 
     def __init__(self, fsock=None, filename=None, compressed=None, prepend_chr=False,
-                 strict_whitespace=False, encoding='ascii'):
+                 strict_whitespace=False, encoding='ascii', info_fields=None,
+                 parse_samples=True, threads=None, filter_pass_only=False,
+                 require_filters=None, lite_records=False, use_columns=True,
+                 raw_lines=False):
         """ Create a new Reader for a VCF file.
 
             You must specify either fsock (stream) or filename.  Gzipped streams
@@ -247,6 +458,38 @@ class Reader(object):
 
             'strict_whitespace=True' will split records on tabs only (as with VCF
             spec) which allows you to parse files with spaces in the sample names.
+
+            'info_fields' restricts INFO parsing to the given keys, any other
+            entry is skipped without being split or converted.
+
+            'parse_samples=False' leaves the sample columns of every record as
+            one raw string in ``record.raw_samples`` (``record.samples`` stays
+            empty) until ``decode_samples(record)`` is called.
+
+            'lite_records=True' returns ``_LiteRecord`` objects instead of
+            ``_Record``: slotted, with ALT and INFO only parsed when read
+            and the samples left raw, as with 'parse_samples=False'.
+
+            Compressed input is inflated by ``bgzf``: bgzip files on up to
+            'threads' threads (default: up to 4), plain gzip as a stream.
+
+            'filter_pass_only=True' skips every record whose FILTER is not
+            PASS ('.' included), and 'require_filters' every record whose
+            FILTER does not list all the given filter names.  Rejected lines
+            are dropped on their raw FILTER column, before anything else is
+            parsed, by ``next``, ``iter_fields``, ``iter_batches`` and
+            ``fetch`` alike.
+
+            'use_columns=True' makes ``iter_batches`` read the columnar copy
+            written by ``vcfcolumns.convert`` when the file has an up to
+            date one and no record was read before.
+
+            'raw_lines=True' keeps the text line of every record in
+            ``record.raw_line``, which a ``passthrough=True`` ``Writer``
+            writes back as is.  Setting an attribute of such a record or
+            changing its ALT, FILTER, samples or INFO containers clears
+            ``raw_line``; code changing values deeper in (a list inside
+            INFO, the calls of the samples) must clear it itself.
         """
         super(Reader, self).__init__()
 
@@ -262,12 +505,14 @@ class Reader(object):
         elif filename:
             if compressed is None:
                 compressed = filename.endswith('.gz')
-            self._reader = open(filename, 'rb' if compressed else 'rt')
+            self._reader = open(filename, 'rb')
         self.filename = filename
+        #: raw lines of binary input, the source of ``self.reader``
+        self._byte_lines = None
         if compressed:
-            self._reader = gzip.GzipFile(fileobj=self._reader)
-            if sys.version > '3':
-                self._reader = codecs.getreader(encoding)(self._reader)
+            self._byte_lines = bgzf.iter_byte_lines(bgzf.iter_chunks(self._reader, threads))
+        elif hasattr(self._reader, 'read') and not isinstance(self._reader, io.TextIOBase):
+            self._byte_lines = bgzf.iter_byte_lines(bgzf.iter_file_chunks(self._reader))
 
         if strict_whitespace:
             self._separator = '\t'
@@ -275,9 +520,18 @@ class Reader(object):
             self._separator = '\t| +'
 
         self._row_pattern = re.compile(self._separator)
+        self._byte_row_pattern = re.compile(self._separator.encode('ascii'))
         self._alt_pattern = re.compile('[\[\]]')
 
-        self.reader = (line.strip() for line in self._reader if line.strip())
+        self._filter_pass_only = filter_pass_only
+        self._require_filters = frozenset(require_filters) if require_filters else None
+        self.encoding = encoding
+
+        if self._byte_lines is not None:
+            self._byte_lines = self._push_filter(self._byte_lines)
+            self.reader = _decoded_lines(self._byte_lines, encoding)
+        else:
+            self.reader = self._push_filter(_stripped_lines(self._reader))
 
         #: metadata fields from header (string or hash, depending)
         self.metadata = None
@@ -296,10 +550,26 @@ class Reader(object):
         self._header_lines = []
         self._column_headers = []
         self._tabix = None
+        self._index = None
+        self._threads = threads
         self._prepend_chr = prepend_chr
+        self._info_fields = None
+        self._skip_samples = not parse_samples or lite_records
+        self._lite_records = lite_records
+        self._use_columns = use_columns
+        self._keep_lines = raw_lines
+        self._columns = None
+        self._at_start = True
+        #: CHROM values seen by ``iter_batches``, indexed by batch code
+        self.chrom_codes = []
+        #: raw FILTER strings seen by ``iter_batches``, indexed by batch code
+        self.filter_codes = []
+        self._chrom_index = {}
+        self._filter_index = {}
         self._parse_metainfo()
+        if info_fields is not None:
+            self._info_fields = frozenset(info_fields)
         self._format_cache = {}
-        self.encoding = encoding
 
     def __iter__(self):
         return self
@@ -369,8 +639,13 @@ class Reader(object):
 
         entries = info_str.split(';')
         retdict = {}
+        fields = self._info_fields
 
         for entry in entries:
+            if fields is not None:
+                end = entry.find('=')
+                if (entry[:end] if end >= 0 else entry) not in fields:
+                    continue
             entry = entry.split('=', 1)
             ID = entry[0]
             try:
@@ -542,8 +817,12 @@ class Reader(object):
 
     def __next__(self):
         '''Return the next record in the file.'''
+        self._at_start = False
         line = next(self.reader)
-        row = self._row_pattern.split(line.rstrip())
+        if self._skip_samples:
+            row = self._row_pattern.split(line.rstrip(), 9)
+        else:
+            row = self._row_pattern.split(line.rstrip())
         chrom = row[0]
         if self._prepend_chr:
             chrom = 'chr' + chrom
@@ -555,7 +834,6 @@ class Reader(object):
             ID = None
 
         ref = row[3]
-        alt = self._map(self._parse_alt, row[4].split(','))
 
         try:
             qual = int(row[5])
@@ -572,7 +850,6 @@ class Reader(object):
             filt = []
         else:
             filt = filt.split(';')
-        info = self._parse_info(row[7])
 
         try:
             fmt = row[8]
@@ -582,17 +859,255 @@ class Reader(object):
             if fmt == '.':
                 fmt = None
 
-        record = _Record(chrom, pos, ID, ref, alt, qual, filt,
-                info, fmt, self._sample_indexes)
-
-        if fmt is not None:
-            samples = self._parse_samples(row[9:], fmt, record)
-            record.samples = samples
+        if self._lite_records:
+            raw_samples = None
+            if fmt is not None:
+                raw_samples = row[9] if len(row) > 9 else ''
+            lite_record = _TrackedLiteRecord if self._keep_lines else _LiteRecord
+            record = lite_record(self, chrom, pos, ID, ref, row[4], qual, filt, row[7],
+                                 fmt, raw_samples)
+        else:
+            alt = self._map(self._parse_alt, row[4].split(','))
+            info = self._parse_info(row[7])
+            full_record = _TrackedRecord if self._keep_lines else _Record
+            record = full_record(chrom, pos, ID, ref, alt, qual, filt,
+                    info, fmt, self._sample_indexes)
+
+            if fmt is not None:
+                if self._skip_samples:
+                    record.raw_samples = row[9] if len(row) > 9 else ''
+                else:
+                    samples = self._parse_samples(row[9:], fmt, record)
+                    record.samples = samples
 
+        if self._keep_lines:
+            line = line.rstrip()
+            self._track(record, 'chr' + line if self._prepend_chr else line)
         return record
 
+    def _track(self, record, line):
+        '''Keep line as the ``raw_line`` of a tracked record, with its
+        containers replaced by ones clearing it when changed.'''
+        if isinstance(record.FILTER, list):
+            record.FILTER = _TrackedList(record, record.FILTER)
+        record.samples = _TrackedList(record, record.samples)
+        if not isinstance(record, _LiteRecord):
+            record.ALT = _TrackedList(record, record.ALT)
+            record.INFO = _TrackedDict(record, record.INFO)
+        record.raw_line = line
+
+    def decode_samples(self, record):
+        '''Parse the sample columns a ``parse_samples=False`` reader kept
+        raw, store them in ``record.samples`` and return them.'''
+        raw = getattr(record, 'raw_samples', None)
+        if raw is not None:
+            raw_line = getattr(record, 'raw_line', None)
+            samples = self._parse_samples(
+                self._row_pattern.split(raw), record.FORMAT, record)
+            record.samples = samples if raw_line is None else _TrackedList(record, samples)
+            record.raw_samples = None
+            if raw_line is not None:
+                # decoding the samples does not change the record
+                record.raw_line = raw_line
+        return record.samples
+
+    def _push_filter(self, lines):
+        '''Drop the lines the FILTER options reject from ``lines`` (raw
+        bytes or text lines).'''
+        if not self._filter_pass_only and not self._require_filters:
+            return lines
+        return _filtered_lines(lines, self._filter_splitter(), self._keep_filter)
+
+    def _filter_splitter(self):
+        text_split = self._row_pattern.split
+        byte_split = self._byte_row_pattern.split
+
+        def split(line, maxsplit):
+            if isinstance(line, bytes):
+                return byte_split(line, maxsplit)
+            return text_split(line, maxsplit)
+        return split
+
+    def _keep_filter(self, value):
+        if isinstance(value, bytes):
+            value = value.decode(self.encoding)
+        value = value.strip()
+        if self._filter_pass_only and value != 'PASS':
+            return False
+        if self._require_filters:
+            return self._require_filters.issubset(value.split(';'))
+        return True
+
+    def _raw_lines(self):
+        '''The remaining non blank, non ``#`` lines as stripped bytes.'''
+        if self._byte_lines is None or self._tabix is not None:
+            encoding = self.encoding
+            for line in self.reader:
+                yield line.encode(encoding)
+            return
+        for line in self._byte_lines:
+            line = line.strip()
+            if line and line[:1] != b'#':
+                yield line
+
+    def iter_fields(self, fields=('CHROM', 'POS', 'FILTER', 'INFO')):
+        '''Iterate over the remaining records as tuples of the raw strings
+        of the requested ``fields`` (column names of the header line, e.g.
+        ``('CHROM', 'POS', 'INFO')``).
+
+        Lines are split as bytes and only the requested columns are decoded;
+        nothing else about the record is parsed.
+        '''
+        self._at_start = False
+        indexes = [self._column_headers.index(field) for field in fields]
+        maxsplit = max(indexes) + 1
+        split = self._byte_row_pattern.split
+        encoding = self.encoding
+        prepend = [i == 0 and self._prepend_chr for i in indexes]
+        for line in self._raw_lines():
+            row = split(line, maxsplit)
+            yield tuple(['chr' + row[i].decode(encoding) if p else row[i].decode(encoding)
+                         for i, p in zip(indexes, prepend)])
+
+    def iter_batches(self, n=10000):
+        '''Iterate over the remaining records in blocks of up to ``n`` lines,
+        decoded into column arrays instead of ``_Record`` objects.
+
+        Each block is a ``Batch`` namedtuple.  CHROM and FILTER hold int32
+        codes into ``self.chrom_codes`` and ``self.filter_codes`` (the raw
+        FILTER string, e.g. ``'PASS'`` or ``'q10;s50'``), POS is int64 and
+        QUAL is float32 with NaN for missing values.  ID, REF and ALT are
+        lists of the raw strings.  INFO maps every key found in the block to
+        a column: a float64 array (NaN when absent) for single valued
+        Integer and Float fields, a bool array for Flags and otherwise a
+        list with the value ``_parse_info`` would give (None when absent).
+
+        Lines are read and split as bytes; CHROM and FILTER are only decoded
+        the first time a value is seen.  Sample columns are never parsed in
+        this mode.
+
+        The blocks are read from the columnar copy of the file instead when
+        ``columnar_copy`` finds one.
+
+        requires numpy
+        '''
+        if np is None:
+            raise Exception('numpy not available, try "pip install numpy"?')
+
+        columns = self.columnar_copy()
+        if columns is not None:
+            self._at_start = False
+            for rows, batch in columns.iter_batches(self, n):
+                yield batch
+            return
+
+        lines = self._raw_lines()
+        while True:
+            block = list(itertools.islice(lines, n))
+            if not block:
+                return
+            yield self._decode_batch(block)
+
+    def columnar_copy(self):
+        '''The ``vcfcolumns.ColumnarVCF`` of the file, when 'use_columns' is
+        set, the file has an up to date columnar copy and no record was read
+        yet, else None.'''
+        if not (self._use_columns and self._at_start and self.filename) or self._tabix is not None:
+            return None
+        if self._columns is None:
+            # imported here, as vcfcolumns builds on this module
+            from readers import vcfcolumns
+            self._columns = vcfcolumns.load_columns(self.filename) or False
+        return self._columns or None
+
+    def _batch_code(self, value, table, index):
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(table)
+            table.append(value.decode(self.encoding))
+        return code
+
+    def _decode_batch(self, lines):
+        '''Decode a list of raw byte lines into a ``Batch`` of columns.'''
+        size = len(lines)
+        split = self._byte_row_pattern.split
+        encoding = self.encoding
+        # the sample columns stay in the last, unsplit item
+        rows = [split(line, 8) for line in lines]
+
+        chroms = [row[0] for row in rows]
+        if self._prepend_chr:
+            chroms = [b'chr' + chrom for chrom in chroms]
+        chrom_codes = self.chrom_codes
+        chrom_index = self._chrom_index
+        chrom = np.array([self._batch_code(x, chrom_codes, chrom_index)
+                          for x in chroms], dtype=np.int32)
+
+        filter_codes = self.filter_codes
+        filter_index = self._filter_index
+        filt = np.array([self._batch_code(row[6], filter_codes, filter_index)
+                         for row in rows], dtype=np.int32)
+
+        pos = np.array([row[1] for row in rows]).astype(np.int64)
+        qual = np.array([row[5] if row[5] != b'.' else b'nan'
+                         for row in rows]).astype(np.float32)
+
+        info_raw = {}
+        fields = self._info_fields
+        for i, row in enumerate(rows):
+            if row[7] == b'.':
+                continue
+            for entry in row[7].decode(encoding).split(';'):
+                ID, sep, value = entry.partition('=')
+                if fields is not None and ID not in fields:
+                    continue
+                column = info_raw.get(ID)
+                if column is None:
+                    column = info_raw[ID] = [None] * size
+                column[i] = value if sep else True
+
+        info = OrderedDict()
+        for ID, values in info_raw.items():
+            info[ID] = self._decode_info_column(ID, values)
+
+        return _Batch(chrom, pos,
+                      [row[2].decode(encoding) if row[2] != b'.' else None for row in rows],
+                      [row[3].decode(encoding) for row in rows],
+                      [row[4].decode(encoding) for row in rows],
+                      qual, filt, info)
+
+    def _decode_info_column(self, ID, values):
+        '''Convert the raw values of one INFO key in a batch into a column.'''
+        try:
+            entry_type = self.infos[ID].type
+            entry_num = self.infos[ID].num
+        except KeyError:
+            entry_type = RESERVED_INFO.get(ID, 'String')
+            entry_num = None
+
+        if entry_type == 'Flag':
+            return np.array([x is not None for x in values], dtype=bool)
+
+        if entry_num == 1 and entry_type in ('Integer', 'Float'):
+            try:
+                return np.array([x if x is not None and x != '.' else 'nan'
+                                 for x in values]).astype(np.float64)
+            except ValueError:
+                # malformed numbers, fall back to the per value conversion
+                pass
+
+        column = []
+        for x in values:
+            if x is None:
+                column.append(None)
+            elif x is True:
+                column.append(self._parse_info(ID)[ID])
+            else:
+                column.append(self._parse_info(ID + '=' + x)[ID])
+        return column
+
     def fetch(self, chrom, start=None, end=None):
-        """ Fetches records from a tabix-indexed VCF file and returns an
+        """ Fetches records from an indexed VCF file and returns an
             iterable of ``_Record`` instances
 
             chrom must be specified.
@@ -616,37 +1131,81 @@ class Reader(object):
             If start and end are omitted, all variants on chrom will be
             returned.
 
-            requires pysam
+            Uses the sidecar index built by ``vcfindex.build_index`` when
+            the file has an up to date one, otherwise requires pysam and a
+            tabix index.
 
         """
-        if not pysam:
-            raise Exception('pysam not available, try "pip install pysam"?')
         if not self.filename:
             raise Exception('Please provide a filename (or a "normal" fsock)')
 
+        if self._prepend_chr and chrom[:3] == 'chr':
+            chrom = chrom[3:]
+        self._at_start = False
+
+        if self._index is None and self._tabix is None:
+            self._index = vcfindex.load_index(self.filename)
+        if self._index is not None:
+            self._byte_lines = self._push_filter(self._fetch_lines(chrom, start, end))
+            self.reader = _decoded_lines(self._byte_lines, self.encoding)
+            return self
+
+        if not pysam:
+            raise Exception('No index next to the file (see readers.vcfindex.build_index) '
+                            'and pysam not available, try "pip install pysam"?')
+
         if not self._tabix:
             self._tabix = pysam.Tabixfile(self.filename,
                                           encoding=self.encoding)
 
-        if self._prepend_chr and chrom[:3] == 'chr':
-            chrom = chrom[3:]
-
-        self.reader = self._tabix.fetch(chrom, start, end)
+        self.reader = self._push_filter(self._tabix.fetch(chrom, start, end))
         return self
 
+    def _fetch_lines(self, chrom, start, end):
+        '''Raw lines of the records of chrom overlapping [start, end), read
+        from the offset the sidecar index gives for start.'''
+        offset = self._index.offset(chrom, start)
+        if offset is None:
+            return
+        target = chrom.encode(self.encoding)
+        split = self._byte_row_pattern.split
+        with open(self.filename, 'rb') as fsock:
+            if self._index.bgzip:
+                chunks = bgzf.iter_chunks_from(fsock, offset, self._threads)
+            else:
+                fsock.seek(offset)
+                chunks = bgzf.iter_file_chunks(fsock)
+            for line in bgzf.iter_byte_lines(chunks):
+                line = line.strip()
+                if not line or line[:1] == b'#':
+                    continue
+                row = split(line, 8)
+                if row[0] != target:
+                    return
+                rec_start = int(row[1]) - 1
+                if end is not None and rec_start >= end:
+                    return
+                if start is None or vcfindex.record_end(row) > start:
+                    yield line
 
 class Writer(object):
-    """VCF Writer. On Windows Python 2, open stream with 'wb'."""
+    """VCF Writer. On Windows Python 2, open stream with 'wb'.
+
+    With 'passthrough=True' a record still holding its text line in
+    ``raw_line`` (see the 'raw_lines' option of ``Reader``) is written as
+    that line, without being formatted again.
+    """
 
     # Reverse keys and values in header field count dictionary
     counts = dict((v,k) for k,v in field_counts.items())
 
-    def __init__(self, stream, template, lineterminator="\n"):
-        self.writer = csv.writer(stream, delimiter="\t",
-                                 lineterminator=lineterminator,
-                                 quotechar='', quoting=csv.QUOTE_NONE)
+    def __init__(self, stream, template, lineterminator="\n", passthrough=False):
         self.template = template
         self.stream = stream
+        self.lineterminator = lineterminator
+        self.passthrough = passthrough
+        # sorted INFO keys, by the keys of a record in their order
+        self._info_key_orders = {}
 
         # Order keys for INFO fields defined in the header (undefined fields
         # get a maximum key).
@@ -690,15 +1249,48 @@ class Writer(object):
 
     def write_record(self, record):
         """ write a record to the file """
+        raw_line = getattr(record, 'raw_line', None) if self.passthrough else None
+        if raw_line is None:
+            raw_line = '\t'.join(self._record_fields(record))
+        self.stream.write(raw_line + self.lineterminator)
+
+    def write_records(self, records, buffer_lines=10000):
+        """ write every record of an iterable to the file, in one stream
+            write per ``buffer_lines`` lines, and return how many were written
+        """
+        passthrough = self.passthrough
+        terminator = self.lineterminator
+        lines = []
+        written = 0
+        for record in records:
+            raw_line = getattr(record, 'raw_line', None) if passthrough else None
+            if raw_line is None:
+                raw_line = '\t'.join(self._record_fields(record))
+            lines.append(raw_line)
+            if len(lines) >= buffer_lines:
+                self.stream.write(terminator.join(lines) + terminator)
+                written += len(lines)
+                lines = []
+        if lines:
+            self.stream.write(terminator.join(lines) + terminator)
+            written += len(lines)
+        return written
+
+    def _record_fields(self, record):
         ffs = self._map(str, [record.CHROM, record.POS, record.ID, record.REF]) \
-              + [self._format_alt(record.ALT), record.QUAL or '.', self._format_filter(record.FILTER),
-                 self._format_info(record.INFO)]
+              + [self._format_alt(record.ALT), '.' if record.QUAL is None else str(record.QUAL),
+                 self._format_filter(record.FILTER), self._format_info(record.INFO)]
         if record.FORMAT:
             ffs.append(record.FORMAT)
 
-        samples = [self._format_sample(record.FORMAT, sample)
-            for sample in record.samples]
-        self.writer.writerow(ffs + samples)
+        raw_samples = getattr(record, 'raw_samples', None)
+        if raw_samples is not None:
+            # samples a parse_samples=False reader left undecoded
+            if raw_samples:
+                ffs.append(raw_samples)
+            return ffs
+        return ffs + [self._format_sample(record.FORMAT, sample)
+                      for sample in record.samples]
 
     def flush(self):
         """Flush the writer"""
@@ -735,8 +1327,11 @@ class Writer(object):
         def order_key(field):
             # Order by header definition first, alphabetically second.
             return self.info_order[field], field
-        return ';'.join(self._stringify_pair(f, info[f]) for f in
-                        sorted(info, key=order_key))
+        keys = tuple(info)
+        order = self._info_key_orders.get(keys)
+        if order is None:
+            order = self._info_key_orders[keys] = sorted(keys, key=order_key)
+        return ';'.join(self._stringify_pair(f, info[f]) for f in order)
 
     def _format_sample(self, fmt, sample):
         if hasattr(sample.data, 'GT'):
@@ -751,7 +1346,7 @@ class Writer(object):
             return ':'.join([gt] + [self._stringify(x) for x in sample.data[1:]])
 
     def _stringify(self, x, none='.', delim=','):
-        if type(x) == type([]):
+        if isinstance(x, list):
             return delim.join(self._map(str, x, none))
         return str(x) if x is not None else none
 
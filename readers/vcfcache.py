@@ -0,0 +1,47 @@
+import hashlib
+import os
+import os.path as path
+import pickle
+
+
+class VCFFeatureCache(object):
+    '''
+    On-disk cache of the feature groups VCFReader extracts from a VCF file.
+    Entries are keyed by the absolute path, size and modification time of the
+    file plus a fingerprint of the extraction rules, so a changed file or a
+    new version of the rules never hits a stale entry.
+    '''
+
+    def __init__(self, cacheFolder, fingerprint):
+        self.__cacheFolder = cacheFolder
+        self.__fingerprint = fingerprint
+
+    def getCacheFolder(self):
+        return self.__cacheFolder
+
+    def __entryPath(self, filename):
+        stat = os.stat(filename)
+        key = "|".join([path.abspath(filename), str(stat.st_size), str(stat.st_mtime_ns), self.__fingerprint])
+        return path.join(self.__cacheFolder, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pkl")
+
+    def get(self, filename):
+        try:
+            with open(self.__entryPath(filename), "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def put(self, filename, result):
+        '''
+        Stores result for filename. Failures to write (e.g. a read-only
+        folder) only mean the file gets parsed again on the next run.
+        '''
+        try:
+            entryPath = self.__entryPath(filename)
+            os.makedirs(self.__cacheFolder, exist_ok=True)
+            tmpPath = entryPath + "." + str(os.getpid()) + ".tmp"
+            with open(tmpPath, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpPath, entryPath)
+        except OSError as e:
+            print("Could not cache features of " + filename + ": " + str(e))
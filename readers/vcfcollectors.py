@@ -0,0 +1,186 @@
+from abc import ABC, abstractmethod
+
+from readers.anndecoder import ImpactScoreAccumulator
+from readers.vcfrules import FEATURE_GROUP_RULES, TLOD_RULE, QSS_RULE, BIG_QSS_RULE, CLUSTERED_EVENTS_RULE
+
+
+class VCFFeatureCollector(ABC):
+    '''
+    Base class for the feature collectors fed by VCFReader.collectFeatures.
+    The records are read in batches, and visit gets for every batch the
+    (record index, annotations) pairs of its records holding an ANN entry,
+    the annotations decoded by an ANNDecoder into gene, effect and impact
+    codes, along with the {rule name: bool array} indicators of the rules
+    the collector declares, evaluated once over the batch. Several
+    collectors share one pass over the file. The codes of a file all come
+    from the same decoder, whose tables give back the names.
+    '''
+
+    infoFields = ('ANN',)
+    rules = ()
+
+    @abstractmethod
+    def visit(self, batch, annotated, indicators):
+        pass
+
+    @abstractmethod
+    def getResult(self):
+        pass
+
+
+def _ruleGenes(annotated, indicator, prefix, result):
+    '''
+    Adds prefix + gene for the genes annotated on the records indicator
+    holds for.
+    '''
+    if not indicator.any():
+        return
+    for i, annotations in annotated:
+        if indicator[i]:
+            genes = annotations.decoder.genes
+            for gene in annotations.genes:
+                result.add(prefix+genes[gene])
+
+
+class FunctionsCollector(VCFFeatureCollector):
+
+    def __init__(self):
+        self.__functionAnnotations = set()
+
+    def visit(self, batch, annotated, indicators):
+        for i, annotations in annotated:
+            genes = annotations.decoder.genes
+            effects = annotations.decoder.effects
+            for gene, effect in zip(annotations.genes, annotations.effects):
+                if genes[gene] and effects[effect]:
+                    self.__functionAnnotations.add(genes[gene]+"_"+effects[effect])
+
+    def getResult(self):
+        return self.__functionAnnotations
+
+
+class UpperTLODCollector(VCFFeatureCollector):
+
+    rules = (TLOD_RULE,)
+
+    def __init__(self):
+        self.__genes = set()
+
+    def visit(self, batch, annotated, indicators):
+        _ruleGenes(annotated, indicators[TLOD_RULE.name], "TLOD_", self.__genes)
+
+    def getResult(self):
+        return self.__genes
+
+
+class UpperQSICollector(VCFFeatureCollector):
+
+    rules = (QSS_RULE, BIG_QSS_RULE)
+
+    def __init__(self):
+        self.__genes = set()
+
+    def visit(self, batch, annotated, indicators):
+        _ruleGenes(annotated, indicators[QSS_RULE.name], "QSS_", self.__genes)
+        _ruleGenes(annotated, indicators[BIG_QSS_RULE.name], "BIG_QSS_", self.__genes)
+
+    def getResult(self):
+        return self.__genes
+
+
+class ClusteredCollector(VCFFeatureCollector):
+
+    rules = (CLUSTERED_EVENTS_RULE,)
+
+    def __init__(self):
+        self.__genes = set()
+
+    def visit(self, batch, annotated, indicators):
+        _ruleGenes(annotated, indicators[CLUSTERED_EVENTS_RULE.name], "", self.__genes)
+
+    def getResult(self):
+        return self.__genes
+
+
+class FeatureGroupsCollector(VCFFeatureCollector):
+    '''
+    Collects the per file feature groups used to build PatientData: gene
+    scores, gene functions and then one indicator group per rule of
+    FEATURE_GROUP_RULES (TLOD, QSS, big QSS, clustered, germline risk and
+    somatic risk genes). The feature names and filtering lookups of every
+    gene, effect and impact code are worked out once per file.
+
+    The impact weights of the genes are summed per file and a gene scores 1
+    when its total reaches scoreThreshold, genes below it are left out.
+    '''
+
+    rules = tuple(FEATURE_GROUP_RULES)
+
+    def __init__(self, hasheffect, filtering, scoreThreshold):
+        self.__hasheffect = hasheffect
+        self.__filtering = filtering
+        self.__scoreThreshold = scoreThreshold
+        self.__genes = set()
+        self.__decoder = None
+        self.__genetoscore = None
+        self.__gene_function = {}
+        self.__groups = [{} for rule in self.rules]
+        self.__geneNames = {}
+        self.__filteredEffects = {}
+        self.__knownImpacts = set()
+
+    def __names(self, decoder, gene):
+        names = self.__geneNames.get(gene)
+        if names is None:
+            name = decoder.genes[gene]
+            names = self.__geneNames[gene] = (name, name in self.__filtering["genes"],
+                                              [rule.prefix+name for rule in self.rules])
+        return names
+
+    def visit(self, batch, annotated, indicators):
+        if not annotated:
+            return
+        decoder = annotated[0][1].decoder
+        if self.__genetoscore is None:
+            self.__decoder = decoder
+            self.__genetoscore = ImpactScoreAccumulator(decoder, self.__hasheffect)
+        ruleIndicators = [indicators[rule.name] for rule in self.rules]
+
+        for i, annotations in annotated:
+            memorized_geneinstances = set()
+            for gene, effect, impact in zip(annotations.genes, annotations.effects, annotations.impacts):
+                names = self.__names(decoder, gene)
+                if impact not in self.__knownImpacts:
+                    # unknown impacts raise here, rather than weighting 0
+                    self.__hasheffect[decoder.impacts[impact]]
+                    self.__knownImpacts.add(impact)
+                gene_instance = names[0]
+                if gene_instance and gene not in memorized_geneinstances:
+                    memorized_geneinstances.add(gene)
+                    self.__genes.add(gene_instance)
+                    inFunctions = self.__filteredEffects.get(effect)
+                    if inFunctions is None:
+                        inFunctions = self.__filteredEffects[effect] = decoder.effects[effect] in self.__filtering["functions"]
+                    if inFunctions and names[1]:
+                        self.__gene_function[gene_instance+"_"+decoder.effects[effect]] = 1
+                    self.__genetoscore.add(gene, impact)
+
+        for indicator, group, r in zip(ruleIndicators, self.__groups, range(len(self.rules))):
+            if not indicator.any():
+                continue
+            for i, annotations in annotated:
+                if indicator[i]:
+                    for gene in annotations.genes:
+                        group[self.__names(decoder, gene)[2][r]] = 1
+
+    def getGenes(self):
+        return self.__genes
+
+    def getGenesScoring(self):
+        if self.__genetoscore is None:
+            return {}
+        genes = self.__decoder.genes
+        return {genes[gene]: 1 for gene in self.__genetoscore.genesAtOrAbove(self.__scoreThreshold)}
+
+    def getResult(self):
+        return (self.getGenesScoring(), self.__gene_function) + tuple(self.__groups)
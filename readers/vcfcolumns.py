@@ -0,0 +1,248 @@
+""" Columnar copies of VCF files, so repeat scans of a file read memory
+mapped columns instead of inflating and splitting its text.
+
+The copy of ``<vcf>`` is the folder ``<vcf>.vcfcols``: one ``.npy`` file
+per column, loaded with ``mmap_mode='r'``, and ``meta.json``, which holds
+the CHROM, FILTER, gene, effect and impact tables and the size and
+modification time of the VCF it was converted from.  The columns are
+
+* CHROM and FILTER codes (int32), POS (int64), QUAL (float32, NaN when
+  missing), as ``Reader.iter_batches`` decodes them;
+* ID, REF and ALT as the raw strings, each followed by a newline, in one
+  byte column along with their int64 offsets;
+* per INFO key, a kind column (0 absent, 1 without value, 2 with a value)
+  and either the float64 or bool column ``iter_batches`` decodes the key to
+  or the raw value strings;
+* the SnpEff ANN entries exploded into record index, gene, effect and
+  impact code columns, one row per entry.
+
+Samples are not kept.  Copies are written by ``convert`` (or by running
+this module on VCF files) and read by ``Reader.iter_batches`` and
+``VCFReader.collectFeatures`` whenever the file has an up to date one.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+from readers import parser
+from readers.anndecoder import ANNDecoder
+
+COLUMNS_SUFFIX = '.vcfcols'
+COLUMNS_VERSION = 1
+META_FILE = 'meta.json'
+
+_ABSENT, _FLAG, _VALUE = 0, 1, 2
+
+
+def columns_folder(filename):
+    return filename + COLUMNS_SUFFIX
+
+
+def _save(folder, name, array):
+    np.save(os.path.join(folder, name + '.npy'), np.ascontiguousarray(array))
+
+
+def _save_strings(folder, name, values):
+    """ Saves byte strings as one newline terminated byte column and the
+        offset of every string, plus the end of the last one.
+    """
+    lengths = np.fromiter((len(value) + 1 for value in values), dtype=np.int64, count=len(values))
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    _save(folder, name + '.offsets', offsets)
+    _save(folder, name + '.bytes', np.frombuffer(b''.join(value + b'\n' for value in values), dtype=np.uint8))
+
+
+def convert(filename, compressed=None):
+    """ Writes the columnar copy of the VCF ``filename`` next to it and
+        returns the folder.  An older copy is replaced.
+    """
+    stat = os.stat(filename)
+    reader = parser.Reader(filename=filename, compressed=compressed, parse_samples=False)
+    split = reader._byte_row_pattern.split
+    rows = [split(line, 8) for line in reader._raw_lines()]
+    size = len(rows)
+
+    target = columns_folder(filename)
+    folder = target + '.tmp%d' % os.getpid()
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+
+    chrom_index = {}
+    filter_index = {}
+    _save(folder, 'CHROM', np.array([reader._batch_code(row[0], reader.chrom_codes, chrom_index)
+                                     for row in rows], dtype=np.int32))
+    _save(folder, 'FILTER', np.array([reader._batch_code(row[6], reader.filter_codes, filter_index)
+                                      for row in rows], dtype=np.int32))
+    _save(folder, 'POS', np.array([row[1] for row in rows], dtype=np.bytes_).astype(np.int64))
+    _save(folder, 'QUAL', np.array([row[5] if row[5] != b'.' else b'nan'
+                                    for row in rows], dtype=np.bytes_).astype(np.float32))
+    for name, column in (('ID', 2), ('REF', 3), ('ALT', 4)):
+        _save_strings(folder, name, [row[column] for row in rows])
+
+    raw = {}
+    for i, row in enumerate(rows):
+        if row[7] == b'.':
+            continue
+        for entry in row[7].decode(reader.encoding).split(';'):
+            ID, sep, value = entry.partition('=')
+            column = raw.get(ID)
+            if column is None:
+                column = raw[ID] = [None] * size
+            column[i] = value if sep else True
+
+    info = []
+    for ID, values in raw.items():
+        name = 'INFO.' + ID
+        _save(folder, name + '.kind', np.array([_ABSENT if x is None else _FLAG if x is True else _VALUE
+                                                for x in values], dtype=np.int8))
+        decoded = reader._decode_info_column(ID, values)
+        if isinstance(decoded, np.ndarray):
+            _save(folder, name, decoded)
+            info.append([ID, str(decoded.dtype)])
+        else:
+            _save_strings(folder, name, [x.encode(reader.encoding) if isinstance(x, str) else b''
+                                         for x in values])
+            info.append([ID, 'raw'])
+
+    decoder = ANNDecoder()
+    records, genes, effects, impacts = [], [], [], []
+    present = np.zeros(size, dtype=bool)
+    if 'ANN' in raw:
+        for i, entries in enumerate(reader._decode_info_column('ANN', raw['ANN'])):
+            if entries is None:
+                continue
+            present[i] = True
+            annotations = decoder.decode(entries)
+            records.extend([i] * len(annotations))
+            genes.extend(annotations.genes)
+            effects.extend(annotations.effects)
+            impacts.extend(annotations.impacts)
+    _save(folder, 'ANN.present', present)
+    _save(folder, 'ANN.record', np.array(records, dtype=np.int64))
+    _save(folder, 'ANN.gene', np.array(genes, dtype=np.int32))
+    _save(folder, 'ANN.effect', np.array(effects, dtype=np.int32))
+    _save(folder, 'ANN.impact', np.array(impacts, dtype=np.int32))
+
+    with open(os.path.join(folder, META_FILE), 'w') as f:
+        json.dump({'version': COLUMNS_VERSION, 'records': size, 'encoding': reader.encoding,
+                   'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns,
+                   'chroms': reader.chrom_codes, 'filters': reader.filter_codes, 'info': info,
+                   'genes': decoder.genes, 'effects': decoder.effects, 'impacts': decoder.impacts}, f)
+    shutil.rmtree(target, ignore_errors=True)
+    os.rename(folder, target)
+    return target
+
+
+def load_columns(filename):
+    """ The columnar copy of the VCF ``filename``, or None if it has none or
+        the file changed after it was converted.
+    """
+    folder = columns_folder(filename)
+    try:
+        with open(os.path.join(folder, META_FILE)) as f:
+            meta = json.load(f)
+        stat = os.stat(filename)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != COLUMNS_VERSION or meta['source_size'] != stat.st_size \
+            or meta['source_mtime_ns'] != stat.st_mtime_ns:
+        return None
+    return ColumnarVCF(folder, meta)
+
+
+class ColumnarVCF(object):
+    """ The memory mapped columns of a converted VCF file. """
+
+    def __init__(self, folder, meta):
+        self.folder = folder
+        self.records = meta['records']
+        self.encoding = meta['encoding']
+        self.chroms = meta['chroms']
+        self.filters = meta['filters']
+        self.info = meta['info']
+        #: gene, effect and impact names of the ANN codes
+        self.genes = meta['genes']
+        self.effects = meta['effects']
+        self.impacts = meta['impacts']
+        self._columns = {}
+
+    def column(self, name):
+        array = self._columns.get(name)
+        if array is None:
+            filename = os.path.join(self.folder, name + '.npy')
+            try:
+                array = np.load(filename, mmap_mode='r')
+            except ValueError:
+                # empty columns can not be mapped
+                array = np.load(filename)
+            self._columns[name] = array
+        return array
+
+    def strings(self, name, rows):
+        """ The strings of column ``name`` at the sorted indexes ``rows`` """
+        if not len(rows):
+            return []
+        offsets = self.column(name + '.offsets')
+        data = self.column(name + '.bytes')
+        first, last = rows[0], rows[-1]
+        if last - first + 1 == len(rows):
+            blob = data[offsets[first]:offsets[last + 1] - 1].tobytes()
+            return blob.decode(self.encoding).split('\n')
+        return [data[offsets[r]:offsets[r + 1] - 1].tobytes().decode(self.encoding) for r in rows]
+
+    def annotations(self, rows):
+        """ For the sorted record indexes ``rows``: whether each record has an
+            ANN entry and the bounds of its entries in the ``ANN.`` columns.
+        """
+        records = self.column('ANN.record')
+        return (self.column('ANN.present')[rows], np.searchsorted(records, rows, side='left'),
+                np.searchsorted(records, rows, side='right'))
+
+    def iter_batches(self, reader, n=10000, info_fields=None):
+        """ (record indexes, ``Batch``) for blocks of up to ``n`` records, as
+            ``reader.iter_batches`` decodes them from the text: codes into the
+            CHROM and FILTER tables of ``reader``, with its FILTER options
+            and INFO fields (or ``info_fields``) applied.
+        """
+        chrom_map = np.array([reader._batch_code(
+            (('chr' + chrom) if reader._prepend_chr else chrom).encode(reader.encoding),
+            reader.chrom_codes, reader._chrom_index) for chrom in self.chroms], dtype=np.int32)
+        filter_map = np.array([reader._batch_code(value.encode(reader.encoding), reader.filter_codes,
+                                                  reader._filter_index)
+                               for value in self.filters], dtype=np.int32)
+        selected = np.arange(self.records)
+        if reader._filter_pass_only or reader._require_filters:
+            keep = np.array([reader._keep_filter(value) for value in self.filters], dtype=bool)
+            selected = selected[keep[self.column('FILTER')]]
+
+        fields = reader._info_fields if info_fields is None else info_fields
+        info = [(ID, kind) for ID, kind in self.info if fields is None or ID in fields]
+        for start in range(0, len(selected), n):
+            rows = selected[start:start + n]
+            columns = parser.OrderedDict()
+            for ID, kind in info:
+                kinds = self.column('INFO.' + ID + '.kind')[rows]
+                if not kinds.any():
+                    continue
+                if kind != 'raw':
+                    columns[ID] = np.array(self.column('INFO.' + ID)[rows])
+                    continue
+                values = [None if k == _ABSENT else True if k == _FLAG else x
+                          for k, x in zip(kinds, self.strings('INFO.' + ID, rows))]
+                columns[ID] = reader._decode_info_column(ID, values)
+            yield rows, parser._Batch(chrom_map[self.column('CHROM')[rows]],
+                                      np.array(self.column('POS')[rows]),
+                                      [x if x != '.' else None for x in self.strings('ID', rows)],
+                                      self.strings('REF', rows), self.strings('ALT', rows),
+                                      np.array(self.column('QUAL')[rows]),
+                                      filter_map[self.column('FILTER')[rows]], columns)
+
+
+if __name__ == '__main__':
+    import sys
+    for vcf_filename in sys.argv[1:]:
+        convert(vcf_filename)
+        print('Converted ' + vcf_filename)
@@ -0,0 +1,191 @@
+""" Sidecar region index for VCF files, so ``Reader.fetch`` works without
+pysam and tabix.
+
+For every chromosome the index keeps, per fixed size genomic bin, the
+offset of the first record overlapping that bin: a virtual offset (block
+file offset << 16 | offset in the inflated block) for bgzip files, a byte
+offset for uncompressed ones.  Plain gzip files can not be seeked into and
+are not indexed.  The index is pickled next to the VCF, as ``<vcf>.vcfidx``,
+along with the size and modification time of the file it was built from.
+"""
+import os
+import pickle
+from array import array
+
+from readers import bgzf
+
+INDEX_SUFFIX = '.vcfidx'
+INDEX_VERSION = 2
+#: genomic bin size of new indexes, in bases
+BIN_SIZE = 1 << 14
+
+
+def index_filename(filename):
+    return filename + INDEX_SUFFIX
+
+
+class VCFIndex(object):
+    """ Offsets of the first record overlapping every genomic bin, per
+        chromosome.  Bins no record overlaps hold the offset of the next
+        bin that has one.
+    """
+
+    def __init__(self, bgzip, bin_size, chroms, source_size, source_mtime_ns):
+        self.bgzip = bgzip
+        self.bin_size = bin_size
+        self.chroms = chroms
+        self.source_size = source_size
+        self.source_mtime_ns = source_mtime_ns
+
+    def offset(self, chrom, start=None):
+        """ Offset to start reading from for records of chrom overlapping
+            ``start`` (zero-based) or later, None if there are none.
+        """
+        offsets = self.chroms.get(chrom)
+        if offsets is None:
+            return None
+        b = (start or 0) // self.bin_size
+        if b >= len(offsets):
+            return None
+        return offsets[b]
+
+    def matches(self, filename):
+        stat = os.stat(filename)
+        return stat.st_size == self.source_size and stat.st_mtime_ns == self.source_mtime_ns
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            pickle.dump({'version': INDEX_VERSION, 'bgzip': self.bgzip, 'bin_size': self.bin_size,
+                         'chroms': self.chroms, 'source_size': self.source_size,
+                         'source_mtime_ns': self.source_mtime_ns}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_index(filename):
+    """ The sidecar index of the VCF ``filename``, or None if it has none or
+        the file changed after the index was built.
+    """
+    try:
+        with open(index_filename(filename), 'rb') as f:
+            data = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if data.get('version') != INDEX_VERSION:
+        return None
+    index = VCFIndex(data['bgzip'], data['bin_size'], data['chroms'],
+                     data['source_size'], data['source_mtime_ns'])
+    if not index.matches(filename):
+        return None
+    return index
+
+
+def record_end(row):
+    """ Zero-based exclusive end of the record split into the byte fields
+        ``row`` (INFO included): its INFO ``END`` when it has one, as
+        symbolic structural variants do, else the end of its REF.
+    """
+    start = int(row[1]) - 1
+    if len(row) > 7 and b'END=' in row[7]:
+        for entry in row[7].split(b';'):
+            if entry[:4] == b'END=':
+                try:
+                    return max(start + 1, int(entry[4:]))
+                except ValueError:
+                    break
+    return start + max(1, len(row[3]))
+
+
+def _bgzf_lines(fsock):
+    """ (virtual offset, line) for every line of a BGZF file """
+    partial = []
+    start = None
+    for coffset, data in bgzf.iter_inflated_blocks(fsock):
+        pos = 0
+        size = len(data)
+        while pos < size:
+            nl = data.find(b'\n', pos)
+            if nl < 0:
+                if start is None:
+                    start = coffset << 16 | pos
+                partial.append(data[pos:])
+                break
+            if start is None:
+                yield coffset << 16 | pos, data[pos:nl]
+            else:
+                partial.append(data[pos:nl])
+                yield start, b''.join(partial)
+                partial = []
+                start = None
+            pos = nl + 1
+    if start is not None:
+        yield start, b''.join(partial)
+
+
+def _plain_lines(fsock):
+    """ (byte offset, line) for every line of an uncompressed file """
+    offset = 0
+    for line in fsock:
+        yield offset, line.rstrip(b'\n')
+        offset += len(line)
+
+
+def build_index(filename, bin_size=BIN_SIZE, save=True):
+    """ Builds the index of a bgzipped or uncompressed VCF file sorted by
+        position within contiguous chromosomes, saves it next to the file
+        unless ``save`` is False and returns it.
+    """
+    stat = os.stat(filename)
+    with open(filename, 'rb') as fsock:
+        head = fsock.read(18)
+        fsock.seek(0)
+        bgzip = bgzf.is_bgzf(head)
+        if not bgzip and head[:2] == b'\x1f\x8b':
+            raise ValueError(filename + ' is gzipped but not bgzipped, it can not be indexed')
+        lines = _bgzf_lines(fsock) if bgzip else _plain_lines(fsock)
+
+        chroms = {}
+        offsets = None
+        chrom = None
+        last_pos = 0
+        for offset, line in lines:
+            if not line.strip() or line[:1] == b'#':
+                continue
+            row = line.split(b'\t', 8)
+            if row[0] != chrom:
+                chrom = row[0]
+                name = chrom.decode('ascii')
+                if name in chroms:
+                    raise ValueError(filename + ' is not sorted: ' + name + ' is not contiguous')
+                offsets = chroms[name] = []
+                last_pos = 0
+            pos = int(row[1])
+            if pos < last_pos:
+                raise ValueError(filename + ' is not sorted by position on ' + chrom.decode('ascii'))
+            last_pos = pos
+            start = pos - 1
+            end = record_end(row)
+            last_bin = (end - 1) // bin_size
+            if last_bin >= len(offsets):
+                offsets.extend([None] * (last_bin + 1 - len(offsets)))
+            for b in range(start // bin_size, last_bin + 1):
+                if offsets[b] is None:
+                    offsets[b] = offset
+
+    for name, offsets in chroms.items():
+        following = None
+        for b in range(len(offsets) - 1, -1, -1):
+            if offsets[b] is None:
+                offsets[b] = following
+            following = offsets[b]
+        chroms[name] = array('Q', offsets)
+
+    index = VCFIndex(bgzip, bin_size, chroms, stat.st_size, stat.st_mtime_ns)
+    if save:
+        index.save(index_filename(filename))
+    return index
+
+
+if __name__ == '__main__':
+    import sys
+    for vcf_filename in sys.argv[1:]:
+        build_index(vcf_filename)
+        print('Indexed ' + vcf_filename)
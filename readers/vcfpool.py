@@ -0,0 +1,225 @@
+import faulthandler
+import multiprocessing
+import os
+import os.path as path
+import shutil
+import signal
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from readers.vcfscratch import readFeatureGroups, writeFeatureGroups
+
+# Reader owned by each worker process, built once by _initWorker so the
+# filtering genes and functions are unpickled once per worker instead of
+# being shipped with every task.
+_workerReader = None
+_workerTimeout = None
+_workerScratchFolder = None
+
+# seconds a worker is given past the timeout to raise VCFFileTimeout before
+# it is killed, for files stuck in C code (zlib, numpy) the alarm can not
+# interrupt
+HARD_TIMEOUT_GRACE = 30
+
+WORKER_DIED = "worker process died reading the file (crashed, was killed or went past the timeout)"
+
+# memory backed folder for the scratch files, the scratch transfer being
+# left off where the system has none
+SHARED_MEMORY_FOLDER = "/dev/shm"
+
+
+class VCFFileTimeout(Exception):
+    pass
+
+
+def _initWorker(panel=None, cache=None, timeout=None, scratchFolder=None):
+    global _workerReader, _workerTimeout, _workerScratchFolder
+    from readers.vcfreader import VCFReader
+    _workerReader = VCFReader(cache=cache, panel=panel)
+    _workerTimeout = timeout
+    _workerScratchFolder = scratchFolder
+
+
+def _raiseTimeout(signum, frame):
+    raise VCFFileTimeout("parsing took longer than " + str(_workerTimeout) + " seconds")
+
+
+def _isolated(function, filename):
+    '''
+    Runs function on filename, returning its result and None, or None and
+    the error it raised, so one bad file does not fail the whole pool. The
+    worker timeout raises VCFFileTimeout through SIGALRM, where the system
+    has it, which only interrupts Python code; a worker still busy
+    HARD_TIMEOUT_GRACE seconds later is killed by faulthandler, which the
+    pool reports as a dead worker.
+    '''
+    timed = _workerTimeout is not None
+    alarm = timed and hasattr(signal, "SIGALRM")
+    if timed:
+        faulthandler.dump_traceback_later(_workerTimeout + HARD_TIMEOUT_GRACE, exit=True)
+    if alarm:
+        previous = signal.signal(signal.SIGALRM, _raiseTimeout)
+        signal.setitimer(signal.ITIMER_REAL, _workerTimeout)
+    try:
+        return function(filename), None
+    except Exception as e:
+        return None, type(e).__name__ + ": " + str(e)
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+        if timed:
+            faulthandler.cancel_dump_traceback_later()
+
+
+def readVCFFileTask(filename):
+    result, error = _isolated(_workerReader.readVCFFileFindCompression, filename)
+    return filename, result, error
+
+
+def _readVCFFileToScratch(filename):
+    handle, scratch = tempfile.mkstemp(suffix=".groups", dir=_workerScratchFolder)
+    os.close(handle)
+    writeFeatureGroups(scratch, _workerReader.readVCFFileFindCompression(filename))
+    return scratch
+
+
+def readVCFFileToScratchTask(filename):
+    '''
+    readVCFFileTask handing the scratch file holding the feature groups
+    back instead of the groups.
+    '''
+    scratch, error = _isolated(_readVCFFileToScratch, filename)
+    return filename, scratch, error
+
+
+def getFunctionsTask(filename):
+    result, error = _isolated(_workerReader.getFunctions, filename)
+    return filename, result, error
+
+
+class VCFWorkerPool(object):
+    '''
+    Process pool for parsing VCF files, to be used as a context manager:
+
+        with VCFWorkerPool() as pool:
+            for filename, features, error in pool.run(readVCFFileTask, paths):
+                ...
+
+    Tasks are the module level *Task functions, which run on the VCFReader
+    each worker builds once when it starts, restricted to panel if given.
+    With a VCFFeatureCache, the workers look up and store the feature groups
+    of every file they read in it, so a cold run fills the cache in parallel.
+    The workers are shut down when the block exits. With maxtasksperchild
+    they are started by spawning instead of forking, which ProcessPoolExecutor
+    requires to replace them.
+
+    run reports the files that raised, took longer than timeout seconds or
+    brought their worker down instead of failing.
+
+    With scratch, readVCFFiles has the workers write the feature groups of
+    every file as rows of name ids to a scratch file in shared memory, which
+    the parent memory maps and decodes, instead of pickling them back
+    through the pool. Without a shared memory folder the groups are pickled.
+    '''
+
+    def __init__(self, processes=None, maxtasksperchild=None, panel=None, cache=None, timeout=None,
+                 scratch=False):
+        if processes is None:
+            processes = max(1, multiprocessing.cpu_count() - 1)
+        self.__processes = processes
+        self.__maxtasksperchild = maxtasksperchild
+        self.__panel = panel
+        self.__cache = cache
+        self.__timeout = timeout
+        self.__scratch = scratch and path.isdir(SHARED_MEMORY_FOLDER)
+        self.__scratchFolder = None
+        self.__executor = None
+
+    def __enter__(self):
+        if self.__scratch:
+            self.__scratchFolder = tempfile.mkdtemp(prefix="vcfpool_", dir=SHARED_MEMORY_FOLDER)
+        self.__executor = self.__newExecutor()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__executor.shutdown(wait=exc_type is None, cancel_futures=exc_type is not None)
+        self.__executor = None
+        if self.__scratchFolder is not None:
+            shutil.rmtree(self.__scratchFolder, ignore_errors=True)
+            self.__scratchFolder = None
+        return False
+
+    def __newExecutor(self):
+        return ProcessPoolExecutor(max_workers=self.__processes, initializer=_initWorker,
+                                   initargs=(self.__panel, self.__cache, self.__timeout, self.__scratchFolder),
+                                   max_tasks_per_child=self.__maxtasksperchild)
+
+    def __restart(self):
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+        self.__executor = self.__newExecutor()
+
+    def getProcesses(self):
+        return self.__processes
+
+    def usesScratch(self):
+        return self.__scratch
+
+    def run(self, task, filenames):
+        '''
+        Yields (filename, result, None) for every file, in the order the
+        workers finish them, or (filename, None, error) for the files task
+        could not read. No more files than workers are submitted at once, so
+        the files running are known when a worker dies: the pool is then
+        started again and these files are read once more at the end, one at
+        a time, the file that brings a worker down on its own being reported
+        with WORKER_DIED.
+        '''
+        pending = list(reversed(filenames))
+        running = {}
+        suspects = []
+        while pending or running:
+            while pending and len(running) < self.__processes:
+                filename = pending.pop()
+                running[self.__executor.submit(task, filename)] = filename
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                filename = running.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    suspects.append(filename)
+                    broken = True
+                    continue
+                yield result
+            if broken:
+                suspects.extend(running.values())
+                running = {}
+                self.__restart()
+        for filename in suspects:
+            try:
+                yield self.__executor.submit(task, filename).result()
+            except BrokenProcessPool:
+                self.__restart()
+                yield filename, None, WORKER_DIED
+
+    def readVCFFiles(self, filenames):
+        '''
+        Yields (filename, feature groups, None) for every file, as the
+        workers finish them, or (filename, None, error) for the files that
+        could not be read.
+        '''
+        if not self.__scratch:
+            return self.run(readVCFFileTask, filenames)
+        return self.__readScratchFiles(self.run(readVCFFileToScratchTask, filenames))
+
+    def __readScratchFiles(self, results):
+        for filename, scratch, error in results:
+            if scratch is None:
+                yield filename, None, error
+                continue
+            groups = readFeatureGroups(scratch)
+            os.remove(scratch)
+            yield filename, groups, None
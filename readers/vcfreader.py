@@ -1,100 +1,156 @@
-import multiprocessing
-import vcf
+import hashlib
+import numpy as np
 import pandas as pd
 import pickle
+from readers import parser
+from readers.anndecoder import ANNDecoder, DecodedAnnotations
+from readers.vcfpool import VCFWorkerPool, getFunctionsTask
+from readers.vcfrules import RuleSet
+from readers.vcfcollectors import FeatureGroupsCollector, FunctionsCollector, UpperTLODCollector, \
+    UpperQSICollector, ClusteredCollector
+
+
+FILTERING_FILE = "serialized_features/filteringGenesAndFunctions.pkl"
+
+# Bump whenever the features extracted by readVCFFile change, so cached
+# results of older rules are not reused.
+FEATURE_EXTRACTION_VERSION = 2
+
+# total impact score from which a gene is scored as mutated
+GENE_SCORE_THRESHOLD = 500
 
 
 class VCFReader(object):
 
-    def __init__(self):
+    def __init__(self, cache=None, panel=None):
         self.__vcfinstances = {}
         self.__genes = set()
         self.__genesFunct = set()
         self.__hasheffect = {'HIGH':10000, 'MODERATE':500, 'MODIFIER':30, 'LOW':1}
-        f = open("serialized_features/filteringGenesAndFunctions.pkl", "rb")
-        self.__filtering = pickle.load(f)
+        f = open(FILTERING_FILE, "rb")
+        filteringContent = f.read()
         f.close()
-    
+        self.__filtering = pickle.loads(filteringContent)
+        self.__fingerprint = str(FEATURE_EXTRACTION_VERSION) + "_" + hashlib.sha1(filteringContent).hexdigest()
+        self.__panel = None
+        if panel is not None:
+            self.__panel = frozenset(panel)
+            panelContent = "\n".join(sorted(self.__panel)).encode("utf-8")
+            self.__fingerprint = self.__fingerprint + "_panel_" + hashlib.sha1(panelContent).hexdigest()
+        self.__cache = cache
+        self.__decoder = ANNDecoder()
+
+    def getFeaturesFingerprint(self):
+        '''
+        Identifies the extraction rules, the filtering genes and functions and
+        the gene panel used by readVCFFile, to key cached results.
+        '''
+        return self.__fingerprint
+
     def readVCFFileFindCompression(self, filename):
+        if self.__cache is not None:
+            result = self.__cache.get(filename)
+            if result is not None:
+                return result
         compressed = filename.endswith(".gz")
-        return self.readVCFFile(filename, compressed)
+        result = self.readVCFFile(filename, compressed)
+        if self.__cache is not None:
+            self.__cache.put(filename, result)
+        return result
         
     
     def readVCFFile(self, filename, compressed=True):
-        genetoscore = {}
-        gene_function = {}
-        genes_tlod = {}
-        genes_bigqss = {}
-        genes_qss = {}
-        genes_clustered = {}
-        genes_germline_risk = {}
-        genes_somatic_risk = {}
-        vcfrecords = vcf.Reader(filename=filename, compressed=compressed)
-        for record in vcfrecords:
-            if 'ANN' in record.INFO.keys():
-                ann = record.INFO['ANN']
-                memorized_geneinstances = set()
-                for firstann in ann:
-                    firstann = firstann.split('|')
-                    gene_instance = firstann[3]
-                    score_instance = self.__hasheffect[firstann[2]]
-                    functionAnnotation = firstann[1]
-                    if gene_instance and gene_instance not in memorized_geneinstances:
-                        memorized_geneinstances.add(gene_instance)
-                        self.__genes.add(gene_instance)
-                        if functionAnnotation in self.__filtering["functions"] and gene_instance in self.__filtering["genes"]:
-                            gene_function[gene_instance+"_"+functionAnnotation] = 1
-                        if gene_instance in genetoscore:
-                            genetoscore[gene_instance] = genetoscore[gene_instance] + score_instance
-                        else:
-                            genetoscore[gene_instance] = score_instance
-                    if 'TLOD' in record.INFO.keys() and 'NLOD' in record.INFO.keys():
-                        tlod = record.INFO['TLOD']
-                        nlod = record.INFO['NLOD']
-                        if tlod > nlod:
-                            genes_tlod["TLOD_"+gene_instance] = 1
-                    
-                    if 'QSS' in record.INFO.keys() and 'QSS_NT' in record.INFO.keys():
-                        qss = record.INFO['QSS']
-                        qss_nt = record.INFO['QSS_NT']
-                        if qss > 10:
-                            genes_qss["QSS_"+gene_instance] = 1
-                        if qss > qss_nt:
-                            genes_bigqss["BIGQSS_"+gene_instance] = 1
-                    if 'ECNT' in record.INFO.keys():
-                        ecnt = record.INFO['ECNT']
-                        if float(ecnt) > 1: 
-                            genes_clustered["Clustered_"+gene_instance] = 1
-                    if 'HCNT' in record.INFO.keys():
-                        hcnt = record.INFO['HCNT']
-                        if float(hcnt) > 1:
-                            genes_clustered["Clustered_"+gene_instance] = 1
-                    if 'SAO' in record.INFO.keys():
-                        sao = record.INFO['SAO']
-                        if sao == 1 or sao == 3:
-                            genes_germline_risk["Germline_"+gene_instance] = 1
-                        if sao == 2 or sao == 3:
-                            genes_somatic_risk["Somatic_"+gene_instance] = 1
-                    
-            #else:
-                #print(record)
-                #print('File: '+filename+" don't have ANN entry")
-        return genetoscore, gene_function, genes_tlod, genes_qss, genes_bigqss, genes_clustered, genes_germline_risk, genes_somatic_risk
+        collector = FeatureGroupsCollector(self.__hasheffect, self.__filtering, GENE_SCORE_THRESHOLD)
+        result, = self.collectFeatures(filename, [collector], compressed, self.__panel)
+        self.__genes.update(collector.getGenes())
+        return result
+
+    def collectFeatures(self, filename, collectors, compressed=None, panel=None):
+        """
+        Feeds every collector from a single pass over the records of filename
+        and returns their results, in the same order as collectors. With a
+        panel (a set of gene names) the ANN entries of any other gene are
+        dropped before reaching the collectors. When filename has a columnar
+        copy (see readers.vcfcolumns) the records and their ANN codes are
+        read from it instead of the text.
+        """
+        if compressed is None:
+            compressed = filename.endswith(".gz")
+        rules = RuleSet([rule for collector in collectors for rule in collector.rules])
+        infoFields = rules.infoFields()
+        for collector in collectors:
+            infoFields.update(collector.infoFields)
+        vcfrecords = parser.Reader(filename=filename, compressed=compressed, info_fields=infoFields,
+                                   parse_samples=False)
+        inPanel = self.__decoder.panelMask(panel) if panel is not None else None
+        columns = vcfrecords.columnar_copy()
+        if columns is None:
+            batches = self.__textBatches(vcfrecords)
+        else:
+            batches = self.__columnarBatches(vcfrecords, columns, infoFields)
+        for batch, annotated in batches:
+            if inPanel is not None:
+                annotated = [(i, annotations.select(inPanel)) for i, annotations in annotated]
+                annotated = [(i, annotations) for i, annotations in annotated if annotations]
+            indicators = rules.evaluate(batch, vcfrecords.filter_codes)
+            for collector in collectors:
+                collector.visit(batch, annotated, indicators)
+        return [collector.getResult() for collector in collectors]
+
+    def __textBatches(self, vcfrecords):
+        decoder = self.__decoder
+        for batch in vcfrecords.iter_batches():
+            annotated = []
+            for i, entries in enumerate(batch.INFO.get('ANN', ())):
+                if entries is not None:
+                    annotated.append((i, decoder.decode(entries)))
+            yield batch, annotated
+
+    def __columnarBatches(self, vcfrecords, columns, infoFields):
+        decoder = self.__decoder
+        geneCodes = np.array([decoder.geneCode(gene) for gene in columns.genes], dtype=np.int64)
+        effectCodes = np.array([decoder.effectCode(effect) for effect in columns.effects], dtype=np.int64)
+        impactCodes = np.array([decoder.impactCode(impact) for impact in columns.impacts], dtype=np.int64)
+        # the ANN entries come from their exploded code columns
+        fields = set(infoFields) - {'ANN'}
+        for rows, batch in columns.iter_batches(vcfrecords, info_fields=fields):
+            present, starts, ends = columns.annotations(rows)
+            annotated = []
+            if present.any():
+                first, last = starts[0], ends[-1]
+                genes = geneCodes[columns.column('ANN.gene')[first:last]].tolist()
+                effects = effectCodes[columns.column('ANN.effect')[first:last]].tolist()
+                impacts = impactCodes[columns.column('ANN.impact')[first:last]].tolist()
+                for i in np.flatnonzero(present).tolist():
+                    start, end = starts[i] - first, ends[i] - first
+                    annotated.append((i, DecodedAnnotations(decoder, genes[start:end], effects[start:end],
+                                                            impacts[start:end])))
+            yield batch, annotated
     
-    def getAllFunctions(self, filenames):
+    def getAllFunctions(self, filenames, processes=None):
         functionAnnotations = set()
-        executor = multiprocessing.Pool(processes=multiprocessing.cpu_count()-1)
-        for v in executor.map(self.getFunctions, filenames):
-            for z in v:
-                functionAnnotations.add(z)
+        with VCFWorkerPool(processes) as executor:
+            for filename, v, error in executor.run(getFunctionsTask, filenames):
+                if error is not None:
+                    print("Could not read " + filename + ": " + error)
+                    continue
+                for z in v:
+                    functionAnnotations.add(z)
         
         print(functionAnnotations)
     
-    def getAllFunctionsWithTrueAndFalses(self, filenames, listLabels, outputFile):
+    def getAllFunctionsWithTrueAndFalses(self, filenames, listLabels, outputFile, processes=None):
         truefunctionAnnotations = set()
         falsefunctionAnnotations = set()
-        executor = multiprocessing.Pool(processes=multiprocessing.cpu_count()-1)
-        for l, v in zip(listLabels, executor.map(self.getFunctions, filenames)):
+        functionsByFile = {}
+        with VCFWorkerPool(processes) as executor:
+            for filename, v, error in executor.run(getFunctionsTask, filenames):
+                if error is not None:
+                    print("Could not read " + filename + ": " + error)
+                    v = ()
+                functionsByFile[filename] = v
+        for l, filename in zip(listLabels, filenames):
+            v = functionsByFile[filename]
             if l == "TRUE":
                 for z in v:
                     truefunctionAnnotations.add(z)
@@ -114,64 +170,16 @@ class VCFReader(object):
         outputFile.write(str(falsefunctionAnnotations - intersectionAnnotations) +"\n")
     
     def getFunctions(self, filename, compressed=True):
-        functionAnnotations = set()
-        vcfrecords = vcf.Reader(filename=filename, compressed=compressed)
-        for record in vcfrecords:
-            if 'ANN' in record.INFO.keys():
-                ann = record.INFO['ANN']
-                for firstann in ann:
-                    firstann = firstann.split('|')
-                    if firstann[3] and firstann[1]:
-                        functionAnnotations.add(firstann[3]+"_"+firstann[1])
-        return functionAnnotations
+        return self.collectFeatures(filename, [FunctionsCollector()], compressed)[0]
     
     def getGenesWithUpperTLOD(self, filename, compressed=True):
-        genes = set()
-        vcfrecords = vcf.Reader(filename=filename, compressed=compressed)
-        for record in vcfrecords:
-            if 'ANN' in record.INFO.keys():
-                ann = record.INFO['ANN']
-                for firstann in ann:
-                    firstann = firstann.split('|')
-                    gene_instance = firstann[3]
-                    if 'TLOD' in record.INFO.keys() and 'NLOD' in record.INFO.keys():
-                        tlod = record.INFO['TLOD']
-                        nlod = record.INFO['NLOD']
-                        if tlod > nlod:
-                            genes.add("TLOD_"+gene_instance)
-        return genes
+        return self.collectFeatures(filename, [UpperTLODCollector()], compressed)[0]
     
     def getGenesWithUpperQSI(self, filename, compressed=True):
-        genes = set()
-        vcfrecords = vcf.Reader(filename=filename, compressed=compressed)
-        for record in vcfrecords:
-            if 'ANN' in record.INFO.keys():
-                ann = record.INFO['ANN']
-                for firstann in ann:
-                    firstann = firstann.split('|')
-                    gene_instance = firstann[3]
-                    if 'QSS' in record.INFO.keys() and 'QSS_NT' in record.INFO.keys():
-                        qss = record.INFO['QSS']
-                        qss_nt = record.INFO['QSS_NT']
-                        if qss > 10:
-                            genes.add("QSS_"+gene_instance)
-                        if qss > qss_nt:
-                            genes.add("BIG_QSS_"+gene_instance)
-        return genes
+        return self.collectFeatures(filename, [UpperQSICollector()], compressed)[0]
     
     def getGenesWithVlustered(self, filename, compressed=True):
-        genes = set()
-        vcfrecords = vcf.Reader(filename=filename, compressed=compressed)
-        for record in vcfrecords:
-            if 'ANN' in record.INFO.keys():
-                ann = record.INFO['ANN']
-                for firstann in ann:
-                    firstann = firstann.split('|')
-                    gene_instance = firstann[3]
-                    if 'clustered_events' in record.FILTER:
-                        genes.add(gene_instance)
-
-        return genes
+        return self.collectFeatures(filename, [ClusteredCollector()], compressed)[0]
 
     
     def readFiles(self, files):
@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class RecordRule(object):
+    '''
+    Record level indicator over INFO fields. predicate gets one float column
+    per field of a record batch (NaN where the record lacks the field) and
+    returns a bool array, True for the records the rule holds for. The
+    collectors set the feature prefix + gene for every gene annotated on
+    those records.
+    '''
+
+    def __init__(self, name, prefix, fields, predicate):
+        self.name = name
+        self.prefix = prefix
+        self.fields = tuple(fields)
+        self.predicate = predicate
+
+    def evaluate(self, batch, filterCodes):
+        size = len(batch.POS)
+        columns = [_numericColumn(batch.INFO.get(field), size) for field in self.fields]
+        return np.asarray(self.predicate(*columns), dtype=bool)
+
+
+class FilterRule(RecordRule):
+    '''
+    Record level indicator set when the FILTER column lists filterName. It
+    is evaluated once per distinct FILTER value of the file.
+    '''
+
+    def __init__(self, name, prefix, filterName):
+        RecordRule.__init__(self, name, prefix, (), None)
+        self.filterName = filterName
+
+    def evaluate(self, batch, filterCodes):
+        matches = np.array([self.filterName in code.split(';') for code in filterCodes], dtype=bool)
+        return matches[batch.FILTER]
+
+
+def _numericColumn(column, size):
+    if column is None:
+        return np.full(size, np.nan)
+    if isinstance(column, np.ndarray):
+        return column.astype(np.float64, copy=False)
+    # fields without a single numeric header definition, lists (Number=A)
+    # are read as their first value
+    values = np.full(size, np.nan)
+    for i, value in enumerate(column):
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if value is not None:
+            values[i] = float(value)
+    return values
+
+
+class RuleSet(object):
+    '''
+    The distinct rules of some collectors, evaluated together once per
+    record batch.
+    '''
+
+    def __init__(self, rules):
+        self.rules = list({rule.name: rule for rule in rules}.values())
+
+    def infoFields(self):
+        fields = set()
+        for rule in self.rules:
+            fields.update(rule.fields)
+        return fields
+
+    def evaluate(self, batch, filterCodes):
+        return {rule.name: rule.evaluate(batch, filterCodes) for rule in self.rules}
+
+
+TLOD_RULE = RecordRule('tlod', 'TLOD_', ('TLOD', 'NLOD'), lambda tlod, nlod: tlod > nlod)
+QSS_RULE = RecordRule('qss', 'QSS_', ('QSS', 'QSS_NT'), lambda qss, qss_nt: (qss > 10) & ~np.isnan(qss_nt))
+BIG_QSS_RULE = RecordRule('bigqss', 'BIGQSS_', ('QSS', 'QSS_NT'), lambda qss, qss_nt: qss > qss_nt)
+CLUSTERED_RULE = RecordRule('clustered', 'Clustered_', ('ECNT', 'HCNT'), lambda ecnt, hcnt: (ecnt > 1) | (hcnt > 1))
+GERMLINE_RULE = RecordRule('germline', 'Germline_', ('SAO',), lambda sao: np.isin(sao, (1, 3)))
+SOMATIC_RULE = RecordRule('somatic', 'Somatic_', ('SAO',), lambda sao: np.isin(sao, (2, 3)))
+CLUSTERED_EVENTS_RULE = FilterRule('clustered_events', '', 'clustered_events')
+
+# indicator groups extracted by FeatureGroupsCollector after the gene scores
+# and functions, in the order of its results
+FEATURE_GROUP_RULES = [TLOD_RULE, QSS_RULE, BIG_QSS_RULE, CLUSTERED_RULE, GERMLINE_RULE, SOMATIC_RULE]
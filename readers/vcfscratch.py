@@ -0,0 +1,50 @@
+import mmap
+import struct
+
+import numpy as np
+
+# group count, name count and id count, then the offsets of the groups in
+# the id rows, the id rows and the names joined by newlines
+_HEADER = struct.Struct('<QQQ')
+_OFFSET = np.dtype('<u8')
+_ID = np.dtype('<u4')
+
+
+def writeFeatureGroups(filename, groups):
+    '''
+    Writes indicator feature groups (dicts whose values are all 1, as
+    VCFReader.readVCFFile returns them) to a scratch file, so a worker
+    process hands its results over without pickling them. Every distinct
+    name is stored once, each group being a row of name ids.
+    '''
+    ids = {}
+    rows = [np.fromiter((ids.setdefault(name, len(ids)) for name in group), _ID, len(group)) for group in groups]
+    offsets = np.zeros(len(groups) + 1, _OFFSET)
+    np.cumsum([len(row) for row in rows], out=offsets[1:])
+    with open(filename, 'wb') as f:
+        f.write(_HEADER.pack(len(groups), len(ids), offsets[-1]))
+        f.write(offsets.tobytes())
+        for row in rows:
+            f.write(row.tobytes())
+        f.write(u'\n'.join(ids).encode('utf-8'))
+
+
+def readFeatureGroups(filename):
+    '''
+    The feature groups written by writeFeatureGroups, decoded from a memory
+    map of the scratch file.
+    '''
+    with open(filename, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        groupCount, nameCount, idCount = _HEADER.unpack_from(data, 0)
+        offset = _HEADER.size
+        offsets = np.frombuffer(data, _OFFSET, groupCount + 1, offset).tolist()
+        offset += (groupCount + 1) * _OFFSET.itemsize
+        ids = np.frombuffer(data, _ID, idCount, offset).tolist()
+        offset += idCount * _ID.itemsize
+        names = data[offset:].decode('utf-8').split(u'\n') if nameCount else []
+    finally:
+        data.close()
+    return tuple(dict.fromkeys([names[i] for i in ids[start:end]], 1)
+                 for start, end in zip(offsets, offsets[1:]))
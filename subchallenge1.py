@@ -111,7 +111,7 @@ def main(argv):
             outputfile = arg
     
     print("Starting reading VCF Files...")
-    preprocessor = VCFDataPreprocessor(inputfile)
+    preprocessor = VCFDataPreprocessor(inputfile, usePanel=True)
     #datasetsUnfiltered = preprocessor.getPatientDataByDataset()
     datasetsFiltered = preprocessor.getPatientDataByDataset(useFiltered=True)
     print("Finished reading VCF Files...")
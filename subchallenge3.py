@@ -83,7 +83,7 @@ def main(argv):
             outputfile = arg
             
     print("Starting reading VCF and Expression Files...")
-    preprocessor = AllDataPreprocessor(inputfile)
+    preprocessor = AllDataPreprocessor(inputfile, usePanel=True)
     datasetsFiltered = preprocessor.getPatientDataByDataset()
     print("Finished reading VCF and Expression Files...")
     
@@ -0,0 +1,40 @@
+import io
+
+import pytest
+
+from readers import bgzf
+
+DATA = b''.join(b'20\t%d\t.\tA\tG\t.\tPASS\t.\n' % pos for pos in range(20000))
+
+
+class _Unclosed(io.BytesIO):
+
+    def close(self):
+        pass
+
+
+def compress(data):
+    stream = _Unclosed()
+    writer = bgzf.BgzfWriter(stream)
+    writer.write(data)
+    writer.close()
+    return stream.getvalue()
+
+
+def testEofBlockIsWritten():
+    assert compress(DATA).endswith(bgzf._EOF_BLOCK)
+
+
+@pytest.mark.parametrize('threads', [1, 2])
+def testCompleteFileIsRead(threads):
+    assert b''.join(bgzf.iter_chunks(io.BytesIO(compress(DATA)), threads)) == DATA
+
+
+@pytest.mark.parametrize('threads', [1, 2])
+def testFileCutAtBlockBoundaryRaises(threads):
+    truncated = compress(DATA)[:-len(bgzf._EOF_BLOCK)]
+    assert bgzf.is_bgzf(truncated[:18])
+    with pytest.raises(EOFError):
+        b''.join(bgzf.iter_chunks(io.BytesIO(truncated), threads))
+    with pytest.raises(EOFError):
+        list(bgzf.iter_inflated_blocks(io.BytesIO(truncated)))
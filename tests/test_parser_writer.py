@@ -0,0 +1,61 @@
+import io
+import os
+
+import pytest
+
+from readers.parser import Reader, Writer
+
+SPEC_EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'benchmarks', 'conformance', 'spec_example.vcf')
+
+
+def dataLines(text):
+    return [line for line in text.split('\n') if line and not line.startswith('#')]
+
+
+def write(records, **options):
+    template = Reader(filename=SPEC_EXAMPLE)
+    stream = io.StringIO()
+    Writer(stream, template, **options).write_records(records)
+    return dataLines(stream.getvalue())
+
+
+@pytest.mark.parametrize('lite', [False, True])
+def testUnchangedRecordsPassThrough(lite):
+    with open(SPEC_EXAMPLE) as f:
+        expected = dataLines(f.read())
+    records = list(Reader(filename=SPEC_EXAMPLE, raw_lines=True, lite_records=lite))
+    assert [record.raw_line for record in records] == expected
+    for record in records:
+        record.FORMAT
+        Reader(filename=SPEC_EXAMPLE).decode_samples(record)
+    assert write(records, passthrough=True) == expected
+
+
+@pytest.mark.parametrize('lite', [False, True])
+def testChangedRecordsAreFormatted(lite):
+    records = list(Reader(filename=SPEC_EXAMPLE, raw_lines=True, lite_records=lite))
+    records[0].POS += 1
+    records[1].FILTER.append('s50')
+    records[2].ALT.pop()
+    lines = write(records, passthrough=True)
+    assert lines[0].split('\t')[1] == '14371'
+    assert lines[1].split('\t')[6] == 'q10;s50'
+    assert lines[2].split('\t')[4] == 'G'
+    assert lines[3] == records[3].raw_line
+
+
+def testChangedInfoIsFormatted():
+    records = list(Reader(filename=SPEC_EXAMPLE, raw_lines=True))
+    records[0].add_info('SOMATIC', True)
+    del records[1].INFO['AF']
+    lines = write(records[:3], passthrough=True)
+    assert lines[0].split('\t')[7].split(';')[-1] == 'SOMATIC'
+    assert 'AF' not in lines[1].split('\t')[7]
+    assert lines[2] == records[2].raw_line
+
+
+def testNoPassthroughByDefault():
+    records = list(Reader(filename=SPEC_EXAMPLE, raw_lines=True))
+    records[0].raw_line = 'not a VCF line'
+    assert write(records[:1])[0].startswith('20\t14370\trs6054257\t')
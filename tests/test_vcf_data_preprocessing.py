@@ -0,0 +1,98 @@
+import gzip
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocessor.vcf_data_preprocessing import CYTOGENETICS_PROPS, GENOMIC_PROPS, QUARANTINE_FILE, VCFDataPreprocessor
+from readers import vcfpool
+from readers.vcfpool import readVCFFileTask
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOMATIC_CALLS = os.path.join(ROOT, 'benchmarks', 'conformance', 'somatic_calls.vcf')
+
+
+@pytest.fixture(autouse=True)
+def inRepository(monkeypatch):
+    # the workers load the filtering genes and functions relative to the repository
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def cohort(tmp_path):
+    '''
+    A clinical file of four MuTect patients: P0 and P1 with a readable VCF,
+    P2 with a truncated one and P3 with one that is not gzipped at all.
+    '''
+    folder = tmp_path / 'vcfs'
+    folder.mkdir()
+    with open(SOMATIC_CALLS, 'rb') as f:
+        content = f.read()
+    for name in ['good0.vcf.gz', 'good1.vcf.gz']:
+        with gzip.open(str(folder / name), 'wb') as out:
+            out.write(content)
+    compressed = gzip.compress(content)
+    (folder / 'truncated.vcf.gz').write_bytes(compressed[:len(compressed) // 2])
+    (folder / 'garbage.vcf.gz').write_bytes(b'not a VCF file\n' * 100)
+
+    clinical = pd.DataFrame({'Patient': ['P0', 'P1', 'P2', 'P3'], 'D_Age': [70, 50, 60, 80], 'D_ISS': [2, 1, 3, 2],
+                             'HR_FLAG': ['TRUE', 'FALSE', 'TRUE', 'FALSE']})
+    for column in GENOMIC_PROPS.values():
+        clinical[column] = np.nan
+    clinical['WES_mutationFileMutect'] = ['good0.vcf.gz', 'good1.vcf.gz', 'truncated.vcf.gz', 'garbage.vcf.gz']
+    for column in CYTOGENETICS_PROPS:
+        clinical[column] = 0
+    clinicalFile = str(tmp_path / 'clinical.csv')
+    clinical.to_csv(clinicalFile, index=False)
+    return clinicalFile, str(folder) + os.sep, str(tmp_path / 'cache')
+
+
+def crashingTask(filename):
+    if filename.endswith('good1.vcf.gz'):
+        os._exit(1)
+    return readVCFFileTask(filename)
+
+
+def slowTask(filename):
+    if filename.endswith('good1.vcf.gz'):
+        result, error = vcfpool._isolated(lambda f: time.sleep(60), filename)
+        return filename, result, error
+    return readVCFFileTask(filename)
+
+
+def readCohort(cohort, fileTimeout=None):
+    clinical, folder, cacheFolder = cohort
+    preprocessor = VCFDataPreprocessor(clinical, cacheFolder=cacheFolder, processes=2, fileTimeout=fileTimeout)
+    result = preprocessor.getPatientDataByDataset(folder, forTraining=True)
+    with open(os.path.join(cacheFolder, QUARANTINE_FILE)) as f:
+        report = json.load(f)
+    return result, preprocessor.getQuarantine(), report
+
+
+def testUnreadableFilesAreQuarantined(cohort):
+    result, quarantine, report = readCohort(cohort)
+    folder = cohort[1]
+    assert sorted(quarantine) == [folder + 'garbage.vcf.gz', folder + 'truncated.vcf.gz']
+    assert report == {os.path.abspath(p): error for p, error in quarantine.items()}
+    assert list(result["MuTectsnvs"].get_patients()) == ["P0", "P1"]
+
+
+def testCrashedFilesAreQuarantined(cohort, monkeypatch):
+    # the workers are forked from this process, with its task
+    monkeypatch.setattr(vcfpool, 'readVCFFileTask', crashingTask)
+    result, quarantine, report = readCohort(cohort)
+    crashed = os.path.abspath(cohort[1] + 'good1.vcf.gz')
+    assert report[crashed] == vcfpool.WORKER_DIED
+    assert len(report) == 3
+    assert list(result["MuTectsnvs"].get_patients()) == ["P0"]
+
+
+def testTimedOutFilesAreQuarantined(cohort, monkeypatch):
+    monkeypatch.setattr(vcfpool, 'readVCFFileTask', slowTask)
+    result, quarantine, report = readCohort(cohort, fileTimeout=0.5)
+    assert report[os.path.abspath(cohort[1] + 'good1.vcf.gz')].startswith('VCFFileTimeout')
+    assert len(report) == 3
+    assert list(result["MuTectsnvs"].get_patients()) == ["P0"]
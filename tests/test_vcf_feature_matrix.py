@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+
+from preprocessor.vcf_feature_matrix import mergeBinaryColumns
+
+
+def testMergeBinaryColumnsSortsAndMergesByName():
+    index = pd.Index(["P1", "P2", "P3"], name="Patient")
+    dataframe = pd.DataFrame([[1, 0, 0, 0, 0], [0, 0, 1, 0, 0], [0, 2, 0, 0, 1]], index=index,
+                             columns=["TP53", "KRAS", "NRAS", "ZERO", "KRAS"])
+    merged = mergeBinaryColumns(dataframe)
+    # as the groupby over the column names it replaces
+    expected = (dataframe != 0).astype(np.uint8).T.groupby(level=0).max().T
+    expected = expected.loc[:, expected.any()]
+    assert list(merged.columns) == ["KRAS", "NRAS", "TP53"]
+    assert list(merged.index) == ["P1", "P2", "P3"]
+    assert (merged.values == expected.values).all()
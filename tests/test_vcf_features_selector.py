@@ -0,0 +1,89 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from datastructures.patientdata import PatientData
+from preprocessor.vcf_features_selector import VCFFeaturesSelector, loadGenePanel
+from readers.vcfreader import VCFReader
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ORIGIN = "MuTectsnvs_filtered"
+SOMATIC_CALLS = os.path.join(ROOT, "benchmarks", "conformance", "somatic_calls.vcf")
+# the feature groups of VCFReader.readVCFFile, by their serialized name
+GROUPS = ["genesScoring", "genesFunctionAssociated", "genesTlod", "genesQss", "genesBigQss", "genesClustered",
+          "genesGermlineRisk", "genesSomaticRisk"]
+
+
+@pytest.fixture(autouse=True)
+def inRepository(monkeypatch):
+    monkeypatch.chdir(ROOT)
+
+
+def loadFeatures(group):
+    with open(os.path.join(ROOT, "serialized_features", ORIGIN + "_" + group + "_featColumns_CH1.pkl"), "rb") as f:
+        return list(pickle.load(f))
+
+
+def patientData(scoring, origin=ORIGIN):
+    patients = pd.Series(scoring.index, index=scoring.index)
+    data = PatientData(origin, patients)
+    for name in ["ages", "ageRisk", "ISSs", "flags"]:
+        getattr(data, "set_" + name)(pd.Series(np.ones(len(patients)), index=scoring.index))
+    data.set_genes_scoring(scoring)
+    return data
+
+
+def testSelectsTheSerializedFeaturesInOrder():
+    features = loadFeatures("genesScoring")
+    index = pd.Index(["P1", "P2"], name="Patient")
+    scoring = pd.DataFrame({features[2]: [1, 0], "NOT_A_MODEL_GENE": [1, 1], features[0]: [0, 1]}, index=index)
+    selected = VCFFeaturesSelector(patientData(scoring)).generateFilteredData().get_genes_scoring()
+    assert list(selected.columns) == features
+    assert list(selected.index) == ["P1", "P2"]
+    assert list(selected[features[0]]) == [0, 1]
+    assert list(selected[features[2]]) == [1, 0]
+
+
+def testMissingFeaturesAreNaN():
+    # reindex leaves the features a dataset lacks to the imputers of the
+    # models, as .loc did with the pandas they were built with
+    features = loadFeatures("genesScoring")
+    index = pd.Index(["P1", "P2"], name="Patient")
+    scoring = pd.DataFrame({features[0]: [1, 0]}, index=index)
+    selected = VCFFeaturesSelector(patientData(scoring)).generateFilteredData().get_genes_scoring()
+    assert selected[features[1:]].isnull().all().all()
+    assert not selected[features[0]].isnull().any()
+
+
+def testSynonymOriginsUseTheirModelFeatures():
+    features = loadFeatures("genesScoring")
+    index = pd.Index(["P1"], name="Patient")
+    scoring = pd.DataFrame({features[0]: [1]}, index=index)
+    data = patientData(scoring, origin="MuTectRnaseq_filtered")
+    selected = VCFFeaturesSelector(data).generateFilteredData()
+    assert selected.get_dataset_origin() == "MuTectRnaseq_filtered"
+    assert list(selected.get_genes_scoring().columns) == features
+
+
+def modelFeatures(group):
+    features = set()
+    for filename in os.listdir(os.path.join(ROOT, "serialized_features")):
+        if filename.endswith("_" + group + "_featColumns_CH1.pkl"):
+            with open(os.path.join(ROOT, "serialized_features", filename), "rb") as f:
+                features.update(pickle.load(f))
+    return features
+
+
+def testPanelExtractsTheModelFeatures():
+    # somatic_calls.vcf has a germline risk variant without a gene name,
+    # the "Germline_" feature of the Strelka models
+    assert "Germline_" in modelFeatures("genesGermlineRisk")
+    full = VCFReader().readVCFFile(SOMATIC_CALLS, False)
+    restricted = VCFReader(panel=loadGenePanel()).readVCFFile(SOMATIC_CALLS, False)
+    assert "Germline_" in restricted[GROUPS.index("genesGermlineRisk")]
+    for group, fullFeatures, panelFeatures in zip(GROUPS, full, restricted):
+        features = modelFeatures(group)
+        assert set(fullFeatures) & features == set(panelFeatures) & features, group
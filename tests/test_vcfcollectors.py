@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from readers.vcfcollectors import ClusteredCollector, FunctionsCollector, UpperQSICollector, UpperTLODCollector
+from readers.vcfreader import VCFReader
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(ROOT, 'benchmarks', 'conformance')
+SOMATIC_CALLS = os.path.join(CORPUS, 'somatic_calls.vcf')
+
+
+@pytest.fixture(autouse=True)
+def inRepository(monkeypatch):
+    # VCFReader loads the filtering genes and functions relative to the repository
+    monkeypatch.chdir(ROOT)
+
+
+# functions, upper TLOD, upper QSI and clustered genes of the corpus, read
+# off the records by hand: only somatic_calls.vcf has ANN entries. Its
+# germline risk record names no gene, so it has no function but gives
+# QSS_ and BIG_QSS_ (QSS=41, QSS_NT=12), while the TLOD=0.5 < NLOD=1.2
+# record and the record without ANN add no TLOD gene.
+EXPECTED = {
+    'sites_only.vcf': [set(), set(), set(), set()],
+    'spec_example.vcf': [set(), set(), set(), set()],
+    'structural_variants.vcf': [set(), set(), set(), set()],
+    'somatic_calls.vcf': [
+        {'NRAS_missense_variant', 'CSDE1_upstream_gene_variant', 'NRAS_synonymous_variant', 'NRAS_stop_gained',
+         'KRAS_missense_variant', 'TP53_missense_variant&splice_region_variant', 'ARAF_missense_variant'},
+        {'TLOD_NRAS', 'TLOD_CSDE1', 'TLOD_KRAS'},
+        {'QSS_', 'BIG_QSS_', 'BIG_QSS_TP53'},
+        {'NRAS', 'KRAS'},
+    ],
+}
+
+
+def singlePass(filename):
+    return VCFReader().collectFeatures(filename, [FunctionsCollector(), UpperTLODCollector(), UpperQSICollector(),
+                                                  ClusteredCollector()])
+
+
+def perFeature(filename):
+    reader = VCFReader()
+    return [reader.getFunctions(filename, False), reader.getGenesWithUpperTLOD(filename, False),
+            reader.getGenesWithUpperQSI(filename, False), reader.getGenesWithVlustered(filename, False)]
+
+
+def testExpectedCoversTheCorpus():
+    assert sorted(EXPECTED) == sorted(os.listdir(CORPUS))
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def testSinglePassCollectsTheExpectedFeatures(name):
+    assert singlePass(os.path.join(CORPUS, name)) == EXPECTED[name]
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def testPerFeatureGettersReturnTheExpectedFeatures(name):
+    assert perFeature(os.path.join(CORPUS, name)) == EXPECTED[name]
+
+
+def testReadVCFFileAgreesWithTheCollectors():
+    groups = VCFReader().readVCFFile(SOMATIC_CALLS, False)
+    functions, tlod, _, _ = singlePass(SOMATIC_CALLS)
+    # readVCFFile keeps only the filtering functions
+    assert set(groups[1]) <= functions
+    assert set(groups[2]) == tlod
@@ -0,0 +1,42 @@
+import os
+import shutil
+
+import pytest
+
+from readers import vcfindex
+from readers.parser import Reader
+
+STRUCTURAL_VARIANTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   'benchmarks', 'conformance', 'structural_variants.vcf')
+
+
+@pytest.fixture
+def indexed(tmp_path):
+    filename = str(tmp_path / 'structural_variants.vcf')
+    shutil.copy(STRUCTURAL_VARIANTS, filename)
+    vcfindex.build_index(filename, bin_size=1024)
+    return filename
+
+
+def testRecordEndUsesInfoEnd():
+    assert vcfindex.record_end(b'3\t12665100\t.\tA\t<DUP>\t14\tPASS\tSVTYPE=DUP;END=12686200'.split(b'\t')) \
+        == 12686200
+    assert vcfindex.record_end(b'3\t9425916\t.\tC\t<INS>\t23\tPASS\tSVTYPE=INS;END=9425916'.split(b'\t')) \
+        == 9425916
+    assert vcfindex.record_end(b'3\t100\t.\tACG\tA\t23\tPASS\tCIEND=-5,5'.split(b'\t')) == 102
+    assert vcfindex.record_end(b'3\t100\t.\tACG\tA'.split(b'\t')) == 102
+
+
+@pytest.mark.parametrize('start, end, positions', [
+    (12670000, 12670001, [12665100]),
+    (12686199, None, [12665100]),
+    (12686200, None, []),
+    (9425915, 12665100, [9425916, 12665100]),
+])
+def testFetchFindsRecordsOverlappingThroughEnd(indexed, start, end, positions):
+    assert [record.POS for record in Reader(filename=indexed).fetch('3', start, end)] == positions
+
+
+def testFetchUsesEndOfDeletions(indexed):
+    assert [record.POS for record in Reader(filename=indexed).fetch('2', 14477200, 14477300)] == [14477084]
+    assert [record.POS for record in Reader(filename=indexed).fetch('2', 14477381, None)] == []
@@ -0,0 +1,110 @@
+import gzip
+import os
+import signal
+import time
+
+import pytest
+
+from readers import vcfpool
+from readers.vcfpool import VCFWorkerPool, getFunctionsTask, readVCFFileTask
+from readers.vcfreader import VCFReader
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(ROOT, 'benchmarks', 'conformance')
+FILES = [os.path.join(CORPUS, name) for name in sorted(os.listdir(CORPUS))]
+SOMATIC_CALLS = os.path.join(CORPUS, 'somatic_calls.vcf')
+
+
+@pytest.fixture(autouse=True)
+def inRepository(monkeypatch):
+    # the workers load the filtering genes and functions relative to the repository
+    monkeypatch.chdir(ROOT)
+
+
+def crashingTask(filename):
+    if filename == SOMATIC_CALLS:
+        os._exit(1)
+    return readVCFFileTask(filename)
+
+
+def _stuck(filename):
+    # an alarm can not interrupt a worker stuck in C code, which a blocked
+    # SIGALRM stands for here
+    signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGALRM])
+    time.sleep(60)
+
+
+def stuckTask(filename):
+    if filename == SOMATIC_CALLS:
+        result, error = vcfpool._isolated(_stuck, filename)
+        return filename, result, error
+    return readVCFFileTask(filename)
+
+
+def slowTask(filename):
+    if filename == SOMATIC_CALLS:
+        result, error = vcfpool._isolated(lambda f: time.sleep(60), filename)
+        return filename, result, error
+    return readVCFFileTask(filename)
+
+
+def readAll(task, processes=2, timeout=None):
+    with VCFWorkerPool(processes, timeout=timeout) as pool:
+        return {filename: (result, error) for filename, result, error in pool.run(task, FILES)}
+
+
+def expectedGroups(filename):
+    return VCFReader().readVCFFile(filename, False)
+
+
+def testReadsEveryFile():
+    results = readAll(readVCFFileTask)
+    assert sorted(results) == FILES
+    for filename in FILES:
+        assert results[filename] == (expectedGroups(filename), None)
+
+
+def testFunctionsTaskIsIsolated(tmp_path):
+    # getFunctions reads gzipped files
+    compressed = str(tmp_path / 'somatic_calls.vcf.gz')
+    with open(SOMATIC_CALLS, 'rb') as f, gzip.open(compressed, 'wb') as out:
+        out.write(f.read())
+    with VCFWorkerPool(1) as pool:
+        results = list(pool.run(getFunctionsTask, [compressed, SOMATIC_CALLS]))
+    assert results[0] == (compressed, VCFReader().getFunctions(SOMATIC_CALLS, False), None)
+    assert results[1][0] == SOMATIC_CALLS and results[1][1] is None
+    assert results[1][2].startswith('error: ')
+
+
+def testWorkerCrashOnlyFailsItsFile():
+    results = readAll(crashingTask)
+    assert results.pop(SOMATIC_CALLS) == (None, vcfpool.WORKER_DIED)
+    for filename, (result, error) in results.items():
+        assert (result, error) == (expectedGroups(filename), None)
+
+
+def testTimeoutInterruptsPythonCode():
+    start = time.time()
+    results = readAll(slowTask, timeout=0.5)
+    assert time.time() - start < 30
+    assert results[SOMATIC_CALLS][1].startswith('VCFFileTimeout')
+
+
+def testWorkerStuckPastTheTimeoutIsKilled(monkeypatch):
+    # the workers are forked from this process, with its grace
+    monkeypatch.setattr(vcfpool, 'HARD_TIMEOUT_GRACE', 0.5)
+    start = time.time()
+    results = readAll(stuckTask, timeout=0.5)
+    assert time.time() - start < 30
+    assert results.pop(SOMATIC_CALLS) == (None, vcfpool.WORKER_DIED)
+    for filename, (result, error) in results.items():
+        assert (result, error) == (expectedGroups(filename), None)
+
+
+@pytest.mark.skipif(not os.path.isdir(vcfpool.SHARED_MEMORY_FOLDER), reason='no shared memory folder')
+def testScratchTransferRoundTripsWorkerResults():
+    with VCFWorkerPool(2, scratch=True) as pool:
+        assert pool.usesScratch()
+        results = {filename: (result, error) for filename, result, error in pool.readVCFFiles(FILES)}
+    for filename in FILES:
+        assert results[filename] == (expectedGroups(filename), None)
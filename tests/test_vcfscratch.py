@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from readers.vcfreader import VCFReader
+from readers.vcfscratch import readFeatureGroups, writeFeatureGroups
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOMATIC_CALLS = os.path.join(ROOT, 'benchmarks', 'conformance', 'somatic_calls.vcf')
+
+
+@pytest.fixture(autouse=True)
+def inRepository(monkeypatch):
+    # VCFReader loads the filtering genes and functions relative to the repository
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.mark.parametrize('groups', [
+    (),
+    ({}, {}),
+    ({'NRAS': 1, 'KRAS': 1}, {}, {'TLOD_NRAS': 1, 'NRAS': 1}, {u'Géne': 1}),
+])
+def testRoundTrip(tmp_path, groups):
+    scratch = str(tmp_path / 'groups')
+    writeFeatureGroups(scratch, groups)
+    assert readFeatureGroups(scratch) == groups
+
+
+def testRoundTripsTheFeatureGroupsOfAFile(tmp_path):
+    groups = VCFReader().readVCFFile(SOMATIC_CALLS, False)
+    scratch = str(tmp_path / 'groups')
+    writeFeatureGroups(scratch, groups)
+    assert readFeatureGroups(scratch) == groups